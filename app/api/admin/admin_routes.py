@@ -0,0 +1,37 @@
+import hmac
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Header, HTTPException, Query, Request
+
+from app.config.settings import ADMIN_API_KEY
+from background_tasks import run_scheduled_token_cleanup
+
+from .import_services import PARSERS, import_users, iter_lines
+
+router = APIRouter()
+
+def require_admin_api_key(api_key: str = Header(None)):
+    if not ADMIN_API_KEY or api_key is None or not hmac.compare_digest(api_key, ADMIN_API_KEY):
+        raise HTTPException(status_code=403, detail="Admin API key required")
+
+##########################################################################################################
+#                                          BULK IMPORT USERS                                             #
+##########################################################################################################
+
+
+@router.post("/users/import", dependencies=[Depends(require_admin_api_key)])
+async def import_users_route(request: Request, format: str = Query(None, pattern="^(ndjson|csv)$")):
+    # The body is streamed (NDJSON or CSV) and imported batch by batch
+    if format is None:
+        format = "csv" if "csv" in request.headers.get("content-type", "") else "ndjson"
+    rows = PARSERS[format](iter_lines(request.stream()))
+    report = await import_users(rows)
+    return report.as_dict()
+
+##########################################################################################################
+#                                          TOKEN CLEANUP                                                 #
+##########################################################################################################
+@router.post("/tokens/cleanup", status_code=202, dependencies=[Depends(require_admin_api_key)])
+async def cleanup_tokens_route(background_tasks: BackgroundTasks):
+    # Same entry point as the scheduler: it takes the job lock, so it never overlaps a scheduled run
+    background_tasks.add_task(run_scheduled_token_cleanup)
+    return {"message": "Token cleanup started"}
@@ -0,0 +1,247 @@
+import asyncio
+import codecs
+import csv
+import json
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Awaitable, Callable, List
+
+from fastapi import HTTPException
+from sqlalchemy import func, insert, or_, select
+from sqlalchemy.exc import DBAPIError, IntegrityError
+
+from app.config.settings import HASH_POOL_WORKERS, IMPORT_BATCH_SIZE, IMPORT_MAX_REPORTED_ERRORS
+from app.db.database import SessionLocal
+from app.db.models import User
+from app.utils.token_utils import get_hashed_password, get_hashed_password_async, password_context
+from app.utils.validators import normalize_email, validate_email, validate_password
+
+@dataclass
+class ImportReport:
+    imported: int = 0
+    failed: int = 0
+    batches: int = 0
+    # Only the first max_errors are kept so memory stays flat on huge inputs,
+    # unless an error_sink (e.g. a file writer) takes every error instead
+    errors: List[dict] = field(default_factory=list)
+    max_errors: int = IMPORT_MAX_REPORTED_ERRORS
+    error_sink: Callable[[dict], None] = None
+
+    def add_error(self, line: int, email, detail: str):
+        self.failed += 1
+        error = {"line": line, "email": email, "detail": detail}
+        if self.error_sink is not None:
+            self.error_sink(error)
+        elif len(self.errors) < self.max_errors:
+            self.errors.append(error)
+
+    def as_dict(self) -> dict:
+        return {
+            "imported": self.imported,
+            "failed": self.failed,
+            "batches": self.batches,
+            "errors": self.errors,
+            "errors_truncated": self.error_sink is None and self.failed > len(self.errors),
+        }
+
+##########################################################################################################
+#                                              PARSING                                                   #
+##########################################################################################################
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    async for chunk in chunks:
+        buffer += decoder.decode(chunk)
+        *lines, buffer = buffer.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    buffer += decoder.decode(b"", final=True)
+    if buffer:
+        yield buffer.rstrip("\r")
+
+async def parse_ndjson(lines: AsyncIterator[str]):
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError("expected a JSON object")
+            yield line_no, row
+        except ValueError as e:
+            yield line_no, e
+
+async def parse_csv(lines: AsyncIterator[str]):
+    # One record per line (quoted fields may not span lines); the first line is the header
+    header = None
+    line_no = 0
+    async for line in lines:
+        line_no += 1
+        if not line.strip():
+            continue
+        values = next(csv.reader([line]))
+        if header is None:
+            header = [name.strip() for name in values]
+            continue
+        if len(values) != len(header):
+            yield line_no, ValueError(f"expected {len(header)} columns, got {len(values)}")
+            continue
+        yield line_no, dict(zip(header, values))
+
+PARSERS = {"ndjson": parse_ndjson, "csv": parse_csv}
+
+##########################################################################################################
+#                                              IMPORT                                                    #
+##########################################################################################################
+@dataclass
+class _Candidate:
+    line: int
+    email: str
+    username: str
+    currency: str
+    password: str = None
+    password_hash: str = None
+
+# Every field a row may carry; JSON rows can hold numbers, lists or objects where strings are expected
+IMPORT_FIELDS = ("email", "password", "password_hash", "username", "currency")
+# Stored values are checked against the column sizes here: Postgres rejects an over-long one with a DataError
+COLUMN_LENGTHS = {name: User.__table__.c[name].type.length for name in ("email", "username", "currency")}
+
+def _check_length(name: str, value: str):
+    if len(value) > COLUMN_LENGTHS[name]:
+        raise HTTPException(status_code=400, detail=f"{name} is longer than {COLUMN_LENGTHS[name]} characters")
+
+def _validate(line: int, row: dict) -> _Candidate:
+    for name in IMPORT_FIELDS:
+        if row.get(name) is not None and not isinstance(row[name], str):
+            raise HTTPException(status_code=400, detail=f"{name} must be a string")
+    email = normalize_email(row.get("email") or "")
+    validate_email(email)
+    username = (row.get("username") or "").strip() or email.split("@")[0]
+    currency = (row.get("currency") or "").strip() or "EUR"
+    _check_length("email", email)
+    _check_length("username", username)
+    _check_length("currency", currency)
+    # Legacy systems can hand over existing bcrypt/argon2 hashes; they are upgraded on first login
+    password_hash = row.get("password_hash")
+    if password_hash:
+        if len(password_hash) > User.__table__.c.password.type.length or not password_context.identify(password_hash):
+            raise HTTPException(status_code=400, detail="Unsupported password hash format")
+        return _Candidate(line, email, username, currency, password_hash=password_hash)
+    password = row.get("password") or ""
+    validate_password(password)
+    return _Candidate(line, email, username, currency, password=password)
+
+async def hash_in_pool(passwords: List[str]) -> List[str]:
+    # Default hasher: the app's hashing pool, one task per password. Imports wait instead of being shed,
+    # and use at most half the pool so logins queue behind only a few of them.
+    share = asyncio.Semaphore(max(1, HASH_POOL_WORKERS // 2))
+
+    async def hash_one(password: str) -> str:
+        async with share:
+            return await get_hashed_password_async(password, shed=False)
+
+    return list(await asyncio.gather(*(hash_one(p) for p in passwords)))
+
+def hash_many(passwords: List[str]) -> List[str]:
+    return [get_hashed_password(p) for p in passwords]
+
+async def _insert_rows(candidates: List[_Candidate], report: ImportReport):
+    values = [
+        {"email": c.email, "username": c.username, "password": c.password_hash, "currency": c.currency}
+        for c in candidates
+    ]
+    async with SessionLocal() as db:
+        try:
+            await db.execute(insert(User).values(values))
+            await db.commit()
+            report.imported += len(values)
+            return
+        except DBAPIError:
+            await db.rollback()
+    # Someone registered one of these users since the uniqueness check (or a row is otherwise rejected):
+    # retry one row at a time so only the offending rows fail
+    for candidate, row in zip(candidates, values):
+        async with SessionLocal() as db:
+            try:
+                await db.execute(insert(User).values(row))
+                await db.commit()
+                report.imported += 1
+            except IntegrityError:
+                report.add_error(candidate.line, candidate.email, "Email or username already registered")
+            except DBAPIError as e:
+                report.add_error(candidate.line, candidate.email, f"Rejected by the database: {e.orig}")
+
+async def import_batch(rows, report: ImportReport, hash_passwords: Callable[[List[str]], Awaitable[List[str]]]):
+    candidates = []
+    seen_emails, seen_usernames = set(), set()
+    for line, row in rows:
+        if isinstance(row, Exception):
+            report.add_error(line, None, f"Unreadable row: {row}")
+            continue
+        try:
+            candidate = _validate(line, row)
+        except (HTTPException, TypeError, ValueError) as e:
+            # One bad row is reported, never allowed to abort the import
+            report.add_error(line, row.get("email"), e.detail if isinstance(e, HTTPException) else str(e))
+            continue
+        if candidate.email in seen_emails or candidate.username in seen_usernames:
+            report.add_error(line, candidate.email, "Duplicate email or username in import")
+            continue
+        seen_emails.add(candidate.email)
+        seen_usernames.add(candidate.username)
+        candidates.append(candidate)
+
+    if candidates:
+        # One query checks the whole batch against existing accounts
+        async with SessionLocal() as db:
+            existing = (await db.execute(
+                select(User.email, User.username).where(
+                    or_(func.lower(User.email).in_(seen_emails), User.username.in_(seen_usernames))
+                )
+            )).all()
+        taken_emails = {row.email for row in existing}
+        taken_usernames = {row.username for row in existing}
+        fresh = []
+        for candidate in candidates:
+            if candidate.email in taken_emails:
+                report.add_error(candidate.line, candidate.email, "Email already registered")
+            elif candidate.username in taken_usernames:
+                report.add_error(candidate.line, candidate.email, "Username already taken")
+            else:
+                fresh.append(candidate)
+        candidates = fresh
+
+    to_hash = [c for c in candidates if c.password_hash is None]
+    if to_hash:
+        for candidate, hashed in zip(to_hash, await hash_passwords([c.password for c in to_hash])):
+            candidate.password_hash = hashed
+            candidate.password = None
+
+    if candidates:
+        await _insert_rows(candidates, report)
+    report.batches += 1
+
+async def import_users(
+    rows,
+    batch_size: int = IMPORT_BATCH_SIZE,
+    hash_passwords: Callable[[List[str]], Awaitable[List[str]]] = hash_in_pool,
+    on_batch: Callable[[ImportReport], None] = None,
+    report: ImportReport = None,
+) -> ImportReport:
+    # Streams (line, row) pairs; only one batch is held in memory at a time
+    report = report or ImportReport()
+    batch = []
+    async for item in rows:
+        batch.append(item)
+        if len(batch) >= batch_size:
+            await import_batch(batch, report, hash_passwords)
+            batch = []
+            if on_batch:
+                on_batch(report)
+    if batch:
+        await import_batch(batch, report, hash_passwords)
+        if on_batch:
+            on_batch(report)
+    return report
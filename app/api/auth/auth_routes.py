@@ -1,15 +1,14 @@
-import jwt
-from requests import Session
 from fastapi import APIRouter, Depends, HTTPException, Header, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.db.schemas import UserCreate, RequestDetails, UserUpdate
+from app.db.schemas import UserCreate, RequestDetails, RefreshRequest, UserUpdate
 from app.db.database import get_session
 
-from app.config.settings import ALGORITHM, JWT_SECRET_KEY
-from app.utils.jwt_utils import JWTBearer
-from app.utils.rate_limit import rate_limiter
+from app.utils.jwt_utils import get_token_claims, jwt_bearer
+from app.utils.rate_limit import client_ip, rate_limiter
+from app.utils.token_utils import get_authenticated_user_id
 
-from .auth_services import login, logout_user, register_user
+from .auth_services import login, logout_all_sessions, logout_user, refresh_tokens, register_user
 
 router = APIRouter()
 
@@ -18,22 +17,42 @@ router = APIRouter()
 async def register(
     user: UserCreate,
     api_key: str = Header(None),
-    session: Session = Depends(get_session),
+    session: AsyncSession = Depends(get_session),
     request: Request = None,
     dependency: None = Depends(rate_limiter),
 ):
-    return register_user(user, session, request, dependency)
+    return await register_user(user, session, request, dependency)
 
 @router.post('/login')
-def user_login(request: RequestDetails, api_key: str = Header(None), db: Session = Depends(get_session)):
-    return login(request, db)
+async def user_login(
+    request: RequestDetails,
+    http_request: Request,
+    api_key: str = Header(None),
+    db: AsyncSession = Depends(get_session),
+):
+    return await login(request, db, client_ip(http_request))
+
+@router.post('/refresh')
+async def refresh_route(request: RefreshRequest, api_key: str = Header(None), db: AsyncSession = Depends(get_session)):
+    return await refresh_tokens(db, request.refresh_token)
 
 
 @router.post('/logout')
-def logout_route(api_key: str = Header(None), token: str = Depends(JWTBearer()), db: Session = Depends(get_session)):
-    payload = jwt.decode(token, JWT_SECRET_KEY, ALGORITHM)
-    user_id = payload['sub']
+async def logout_route(
+    api_key: str = Header(None),
+    token: str = Depends(jwt_bearer),
+    payload: dict = Depends(get_token_claims),
+    db: AsyncSession = Depends(get_session),
+):
+    user_id = int(payload['sub'])
+
+    return await logout_user(db, user_id, token, payload['exp'])
 
-    logout_user(db, user_id, token)
 
-    return {"message": "Logout Successfully"}
+@router.post('/logout-all')
+async def logout_all_route(
+    api_key: str = Header(None),
+    user_id: int = Depends(get_authenticated_user_id),
+    db: AsyncSession = Depends(get_session),
+):
+    return await logout_all_sessions(db, user_id)
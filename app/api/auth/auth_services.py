@@ -1,35 +1,60 @@
-from datetime import timedelta
+import time
+from datetime import datetime, timedelta
 from fastapi import HTTPException, status, Response, Request
-from sqlalchemy.orm import Session
-from app.db.models import User, TokenTable
+from redis.exceptions import RedisError
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.errors import violated_constraint
+from app.db.models import USERS_EMAIL_INDEX, USERS_USERNAME_CONSTRAINT, User
+from app.db.token_store import get_token_store
 from app.db.schemas import UserCreate, RequestDetails, RequestDetails, UserCreate
 
-from app.utils.token_utils import get_hashed_password, verify_password, create_access_token, create_refresh_token
-from app.utils.rate_limit import redis_client, update_request_info
-from app.utils.validators import validate_email, validate_password
+from app.utils.token_utils import get_hashed_password_async, verify_and_update_password_async, create_access_token, create_refresh_token
+from app.utils.rate_limit import refund_rate_limit
+from app.utils.digest import token_digest
+from app.utils.jwt_utils import decode_refresh_token
+from app.utils.login_throttle import login_throttle
+from app.utils.revocation import revoke_token, revoke_token_digest
+from app.utils.token_generation import bump_token_generation, get_token_generation
+from app.utils.user_cache import get_user_with_password_by_email, invalidate_user
+from app.utils.validators import normalize_email, validate_email, validate_password
 
 from app.config.settings import ACCESS_TOKEN_EXPIRE_MINUTES, REFRESH_TOKEN_EXPIRE_MINUTES
 
+USER_CONFLICTS = {
+    USERS_EMAIL_INDEX: "Email already registered",
+    USERS_USERNAME_CONSTRAINT: "Username already taken",
+}
+
+def raise_user_conflict(error: IntegrityError):
+    # Turns a unique violation on users into the matching 400; anything else is a real error
+    detail = USER_CONFLICTS.get(violated_constraint(error, User.__table__))
+    if detail is None:
+        raise error
+    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+
 ###################################################################################################
 #                                       REGISTER USER                                             #
 ###################################################################################################
-def register_user(user: UserCreate, session: Session, request: Request, dependency: None):
-    redis_key = "rate_limit:" + request.client.host
-    existing_user = session.query(User).filter_by(email=user.email).first()
-    if existing_user:
-        update_request_info(redis_client, redis_key, "failed")
-        raise HTTPException(status_code=400, detail="Email already registered")
-
-    is_valid_email = validate_email(user.email)
-    if not is_valid_email:
-        update_request_info(redis_client, redis_key, "failed")
-    
-    # Validate the password
-    is_valid_password = validate_password(user.password)
-    if not is_valid_password:
-        update_request_info(redis_client, redis_key, "failed")
-
-    encrypted_password = get_hashed_password(user.password)
+async def register_user(user: UserCreate, session: AsyncSession, request: Request, dependency: None):
+    user.email = normalize_email(user.email)
+    try:
+        validate_email(user.email)
+
+        # Validate the password
+        validate_password(user.password)
+    except HTTPException:
+        # Failed registrations do not count towards the rate limit
+        await refund_rate_limit(request)
+        raise
+
+    try:
+        encrypted_password = await get_hashed_password_async(user.password)
+    except HTTPException:
+        # Shed by the hash pool (503 with Retry-After): the retry must not find its slot already used
+        await refund_rate_limit(request)
+        raise
 
     # Set default values for username and currency if not provided
     if user.username is None or user.username == "":
@@ -37,43 +62,66 @@ def register_user(user: UserCreate, session: Session, request: Request, dependen
     if user.currency is None or user.currency == "":
         user.currency = "EUR"
 
-    new_user = User(username=user.username, email=user.email, password=encrypted_password, currency=user.currency)
-    session.add(new_user)
-    session.commit()
-    session.refresh(new_user)
+    # No existence check first: the unique indexes decide, in the same statement (and without a race)
+    try:
+        await session.execute(
+            insert(User).values(username=user.username, email=user.email, password=encrypted_password, currency=user.currency)
+        )
+        await session.commit()
+    except IntegrityError as e:
+        await session.rollback()
+        await refund_rate_limit(request)
+        raise_user_conflict(e)
 
     # Return a redirection response to the login page with email and password in the request body
     response = Response(status_code=308)  # Use 308 to indicate a permanent redirect
     response.headers["Location"] = "/login"  # Replace with your actual login page URL
     response.content = f"email={user.email}&password={user.password}"
-    update_request_info(redis_client, redis_key, "success")
     return {"message": "User created successfully"}
 
 ###################################################################################################
 #                                       LOGIN USER                                                #
 ###################################################################################################
-def login(request: RequestDetails, db: Session):
-    user = db.query(User).filter(User.email == request.email).first()
+async def login(request: RequestDetails, db: AsyncSession, client_ip: str):
+    # Normalized so case variants of an email share one lockout counter
+    request.email = normalize_email(request.email)
+    # Locked-out emails and IPs are turned away before any DB or bcrypt work
+    recent_failures = await login_throttle.check(request.email, client_ip)
+    user, hashed_pass = await get_user_with_password_by_email(db, request.email)
     if user is None:
+        await login_throttle.record_failure(request.email, client_ip)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Incorrect email")
-    hashed_pass = user.password
-    if not verify_password(request.password, hashed_pass):
+    is_valid, new_hash = await verify_and_update_password_async(request.password, hashed_pass)
+    if not is_valid:
+        await login_throttle.record_failure(request.email, client_ip)
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect password"
         )
+    if new_hash:
+        # Outdated scheme or cost: store the upgraded hash in the same commit as the new token
+        await db.execute(update(User).where(User.user_id == user.user_id).values(password=new_hash))
+    generation = await get_token_generation(user.user_id, db, fresh=True)
     access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    access = create_access_token(user.user_id, expires_delta=access_token_expires)
-    refresh = create_refresh_token(user.user_id, expires_delta=timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES))
+    access = create_access_token(user.user_id, expires_delta=access_token_expires, generation=generation)
+    refresh = create_refresh_token(user.user_id, expires_delta=timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES), generation=generation)
     user_id = user.user_id
     username = user.username
     email = user.email
     currency = user.currency
 
-    token_db = TokenTable(user_id=user.user_id,  access_token=access,  refresh_token=refresh, status=True)
-    db.add(token_db)
-    db.commit()
-    db.refresh(token_db)
+    await get_token_store().add(
+        db,
+        user.user_id,
+        token_digest(access),
+        token_digest(refresh),
+        datetime.utcnow() + timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES),
+    )
+    await db.commit()
+    if recent_failures:
+        await login_throttle.record_success(request.email)
+    if new_hash:
+        await invalidate_user(user.user_id, user.email)
     return {
         "user_id": user_id,
         "username": username,
@@ -86,13 +134,68 @@ def login(request: RequestDetails, db: Session):
 ###################################################################################################
 #                                       LOGOUT USER                                               #
 ###################################################################################################
-def logout_user(db: Session, user_id: int, token: str):
-    existing_token = db.query(TokenTable).filter(TokenTable.user_id == user_id, TokenTable.access_token == token).first()
-    if existing_token:
-        existing_token.status = False
-        db.add(existing_token)
-        db.commit()
-        db.refresh(existing_token)
-    else:
+async def logout_user(db: AsyncSession, user_id: int, token: str, expires_at: float):
+    found = await get_token_store().deactivate(db, token_digest(token), user_id)
+    await db.commit()
+    if not found:
         raise HTTPException(status_code=400, detail="Invalid access token")
+    if not await revoke_token(token, expires_at):
+        # The session is ended, but other workers keep accepting the access token until it expires
+        return {"message": "Logout Successfully", "revocation": "degraded"}
     return {"message": "Logout Successfully"}
+
+###################################################################################################
+#                                       LOGOUT EVERYWHERE                                         #
+###################################################################################################
+async def logout_all_sessions(db: AsyncSession, user_id: int):
+    # One increment revokes every access and refresh token the user holds, however many sessions
+    try:
+        await bump_token_generation(db, user_id)
+    except RedisError:
+        # Committed, but not seen by every worker yet; bumping again on retry is harmless
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Could not log out every session, please retry.",
+        )
+    return {"message": "Logged out of all sessions"}
+
+###################################################################################################
+#                                       REFRESH TOKENS                                            #
+###################################################################################################
+async def refresh_tokens(db: AsyncSession, refresh_token: str):
+    payload = decode_refresh_token(refresh_token)
+    if not payload:
+        raise HTTPException(status_code=403, detail="Invalid refresh token or expired refresh token.")
+    user_id = int(payload["sub"])
+    old_digest = token_digest(refresh_token)
+    generation = await get_token_generation(user_id, db, fresh=True)
+    if payload.get("gen", 0) < generation:
+        raise HTTPException(status_code=403, detail="Refresh token has been revoked.")
+
+    access = create_access_token(user_id, expires_delta=timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES), generation=generation)
+    refresh = create_refresh_token(user_id, expires_delta=timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES), generation=generation)
+
+    # Rotate the pair in place: one indexed write, no password check and no new record
+    rotated = await get_token_store().rotate(
+        db,
+        user_id,
+        old_digest,
+        token_digest(access),
+        token_digest(refresh),
+        datetime.utcnow() + timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES),
+    )
+    await db.commit()
+    if rotated:
+        return {"access_token": access, "refresh_token": refresh}
+
+    await revoke_reused_session(db, user_id, old_digest)
+    raise HTTPException(status_code=403, detail="Invalid refresh token or expired refresh token.")
+
+async def revoke_reused_session(db: AsyncSession, user_id: int, refresh_digest: bytes):
+    # A refresh token that was already rotated out is being replayed: end the whole session
+    access_digest = await get_token_store().deactivate_reused(db, user_id, refresh_digest)
+    if access_digest is None:
+        return
+    await db.commit()
+    # The live access token of the session was issued at most ACCESS_TOKEN_EXPIRE_MINUTES ago
+    await revoke_token_digest(access_digest, time.time() + ACCESS_TOKEN_EXPIRE_MINUTES * 60)
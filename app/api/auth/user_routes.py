@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.db.database import get_session
-from app.db.models import User
 from app.db.schemas import (ForgotPasswordRequest, ResetPasswordRequest,
                             UserCreate, UserUpdate)
+from app.utils.rate_limit import forgot_password_rate_limiter
 from app.utils.token_utils import get_authenticated_user_id
+from app.utils.user_cache import get_user_by_email
 
 from .user_services import (delete_user, reset_user_password,
                             send_password_reset_email, update_user_profile)
@@ -20,13 +21,13 @@ router = APIRouter()
 
 
 @router.put('/update/{user_id}', response_model=UserUpdate)
-def update_user_route(
+async def update_user_route(
     user_id: int,
     updated_user: UserUpdate,
     authenticated_user_id: int = Depends(get_authenticated_user_id),
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_session)
 ):
-    return update_user_profile(db, user_id, updated_user, authenticated_user_id)
+    return await update_user_profile(db, user_id, updated_user, authenticated_user_id)
 
 #########################################################################################################
 #                                              DELETE User                                              #
@@ -34,26 +35,26 @@ def update_user_route(
 
 
 @router.delete('/delete/{user_id}')
-def delete_user_route(
+async def delete_user_route(
     user_id: int,
     deleted_user: UserCreate,
     authenticated_user_id: int = Depends(get_authenticated_user_id),
-    db: Session = Depends(get_session)
+    db: AsyncSession = Depends(get_session)
 ):
-    return delete_user(db, user_id, authenticated_user_id, deleted_user)
+    return await delete_user(db, user_id, authenticated_user_id, deleted_user)
 
 ##########################################################################################################
 #                                          SEND RESET PASSWORD LINK                                      #
 ##########################################################################################################
 
 
-@router.post("/forgot-password")
-async def forgot_password_route(request: ForgotPasswordRequest, db: Session = Depends(get_session)):
-    user = db.query(User).filter(User.email == request.email).first()
+@router.post("/forgot-password", dependencies=[Depends(forgot_password_rate_limiter)])
+async def forgot_password_route(request: ForgotPasswordRequest, db: AsyncSession = Depends(get_session)):
+    user = await get_user_by_email(db, request.email)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
 
-    return send_password_reset_email(db, user, FRONT_END_URL)
+    return await send_password_reset_email(db, user, FRONT_END_URL)
 
 ##########################################################################################################
 #                                          RESET PASSWORD                                                #
@@ -61,5 +62,5 @@ async def forgot_password_route(request: ForgotPasswordRequest, db: Session = De
 
 
 @router.post("/reset-password")
-def reset_password_route(request: ResetPasswordRequest, db: Session = Depends(get_session)):
-    return reset_user_password(db, request.reset_token, request.new_password)
+async def reset_password_route(request: ResetPasswordRequest, db: AsyncSession = Depends(get_session)):
+    return await reset_user_password(db, request.reset_token, request.new_password)
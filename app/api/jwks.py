@@ -0,0 +1,21 @@
+# app/api/jwks.py
+
+from fastapi import APIRouter, Header, Response
+
+from app.config.settings import JWKS_MAX_AGE_SECONDS
+from app.utils.jwt_keys import get_key_set
+
+router = APIRouter()
+
+@router.get("/.well-known/jwks.json")
+def jwks(if_none_match: str = Header(None)):
+    # Public keys for verifying access tokens; the document is serialized once per key set
+    keys = get_key_set()
+    headers = {
+        # Keys are published before they sign, so a cached copy always covers the tokens in circulation
+        "Cache-Control": f"public, max-age={JWKS_MAX_AGE_SECONDS}",
+        "ETag": keys.etag,
+    }
+    if if_none_match is not None and if_none_match == keys.etag:
+        return Response(status_code=304, headers=headers)
+    return Response(keys.jwks, media_type="application/json", headers=headers)
@@ -0,0 +1,43 @@
+# app/api/metrics.py
+
+import os
+
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, generate_latest
+
+from app.db import database
+from app.utils.metrics import DB_POOL, HASH_POOL, REDIS_POOL
+from app.utils.redis_client import peek_redis
+from app.utils.token_utils import get_hash_pool_stats
+
+router = APIRouter()
+
+def collect_pool_stats():
+    # Pools are sampled at scrape time instead of being tracked on every checkout
+    pool = database.engine.pool if database.engine is not None else None
+    if hasattr(pool, "checkedout"):
+        DB_POOL.labels("size").set(pool.size())
+        DB_POOL.labels("checked_out").set(pool.checkedout())
+        DB_POOL.labels("overflow").set(max(0, pool.overflow()))
+        DB_POOL.labels("idle").set(pool.checkedin())
+
+    redis_client = peek_redis()
+    if redis_client is not None:
+        redis_pool = redis_client.connection_pool
+        REDIS_POOL.labels("in_use").set(len(getattr(redis_pool, "_in_use_connections", ())))
+        REDIS_POOL.labels("idle").set(len(getattr(redis_pool, "_available_connections", ())))
+        REDIS_POOL.labels("max").set(redis_pool.max_connections)
+
+    for state, value in get_hash_pool_stats().items():
+        HASH_POOL.labels(state).set(value)
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    collect_pool_stats()
+    registry = REGISTRY
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # Aggregate every worker's samples when running several processes
+        from prometheus_client import multiprocess
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,86 @@
+# Builds and inspects the breached password filter (BREACHED_PASSWORD_FILTER_PATH).
+#   python -m app.cli.breached_passwords build pwned-passwords-sha1.txt --output breached.bloom --fp-rate 0.001
+#   python -m app.cli.breached_passwords stats breached.bloom
+# Sources are Pwned Passwords style "SHA1HEX:count" lines (or bare hex); --format plain hashes each line.
+import argparse
+import os
+import time
+
+from app.config.settings import BREACHED_PASSWORD_FILTER_PATH
+from app.utils.breached_passwords import BreachedPasswordFilter, bloom_parameters, build_filter, password_digest
+
+SHA1_SIZE = 20
+
+def read_digests(paths, source_format: str, skipped: list):
+    for path in paths:
+        with open(path, encoding="utf-8", errors="replace") as f:
+            for line in f:
+                if source_format == "plain":
+                    password = line.rstrip("\r\n")
+                    if password:
+                        yield password_digest(password)
+                    continue
+                value = line.split(":", 1)[0].strip()
+                if not value:
+                    continue
+                try:
+                    digest = bytes.fromhex(value)
+                except ValueError:
+                    digest = b""
+                if len(digest) != SHA1_SIZE:
+                    skipped[0] += 1
+                    continue
+                yield digest
+
+def count_entries(paths, source_format: str) -> int:
+    skipped = [0]
+    return sum(1 for _ in read_digests(paths, source_format, skipped))
+
+def report(breached_filter: BreachedPasswordFilter, samples: int):
+    # Random digests are (practically) never in the list, so every hit among them is a false positive
+    probes = [os.urandom(SHA1_SIZE) for _ in range(samples)]
+    started = time.perf_counter()
+    hits = sum(1 for digest in probes if breached_filter.contains_digest(digest))
+    elapsed = time.perf_counter() - started
+    print(f"Entries:        {breached_filter.entries}")
+    print(f"Size:           {breached_filter.size_bytes / 2 ** 20:.1f} MiB "
+          f"({breached_filter.bits / max(1, breached_filter.entries):.1f} bits per entry, {breached_filter.hashes} hashes)")
+    print(f"Expected FPR:   {breached_filter.fp_rate:.6f}")
+    print(f"Measured FPR:   {hits / samples:.6f} ({hits} of {samples} random digests)")
+    print(f"Lookup:         {elapsed / samples * 1e6:.2f} us")
+
+def build(args):
+    entries = args.entries or count_entries(args.sources, args.format)
+    bits, hashes = bloom_parameters(entries, args.fp_rate)
+    print(f"Building a {bits // 8 / 2 ** 20:.1f} MiB filter with {hashes} hashes for {entries} entries")
+    started = time.perf_counter()
+    skipped = [0]
+    breached_filter = build_filter(read_digests(args.sources, args.format, skipped), entries, args.fp_rate, args.output)
+    print(f"Wrote {args.output} in {time.perf_counter() - started:.1f} s"
+          + (f", skipped {skipped[0]} malformed lines" if skipped[0] else ""))
+    report(breached_filter, args.samples)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the breached password filter")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="build a filter from hash lists")
+    build_parser.add_argument("sources", nargs="+")
+    build_parser.add_argument("--output", default=BREACHED_PASSWORD_FILTER_PATH or "breached-passwords.bloom")
+    build_parser.add_argument("--fp-rate", type=float, default=0.001, help="target false-positive rate")
+    build_parser.add_argument("--format", choices=["sha1", "plain"], default="sha1")
+    build_parser.add_argument("--entries", type=int, help="number of entries, saves counting the sources first")
+    build_parser.add_argument("--samples", type=int, default=100000, help="random lookups for the measured FPR")
+    stats_parser = commands.add_parser("stats", help="report a filter's size and false-positive rate")
+    stats_parser.add_argument("path", nargs="?", default=BREACHED_PASSWORD_FILTER_PATH)
+    stats_parser.add_argument("--samples", type=int, default=100000)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        build(args)
+    else:
+        if not args.path:
+            raise SystemExit("No filter given and BREACHED_PASSWORD_FILTER_PATH is not set")
+        report(BreachedPasswordFilter(args.path), args.samples)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,40 @@
+# Measures password hashing cost on this machine and prints settings for a target verify time.
+#   python -m app.cli.calibrate_hashing --target-ms 250 --scheme argon2
+import argparse
+
+from app.config.settings import ARGON2_MEMORY_COST, ARGON2_PARALLELISM, PASSWORD_HASH_SCHEME
+from app.utils.password_hashing import build_password_context, calibrate, measure_hash_ms
+
+def main():
+    parser = argparse.ArgumentParser(description="Calibrate password hashing cost")
+    parser.add_argument("--target-ms", type=float, default=250, help="target verify time per password")
+    parser.add_argument("--scheme", choices=["bcrypt", "argon2"], default=PASSWORD_HASH_SCHEME)
+    parser.add_argument("--argon2-memory-cost", type=int, default=ARGON2_MEMORY_COST, help="KiB")
+    parser.add_argument("--argon2-parallelism", type=int, default=ARGON2_PARALLELISM)
+    parser.add_argument("--samples", type=int, default=3)
+    args = parser.parse_args()
+
+    config = calibrate(
+        {
+            "scheme": args.scheme,
+            "bcrypt_rounds": 12,
+            "argon2_time_cost": 3,
+            "argon2_memory_cost": args.argon2_memory_cost,
+            "argon2_parallelism": args.argon2_parallelism,
+        },
+        args.target_ms,
+        args.samples,
+    )
+    measured = measure_hash_ms(build_password_context(**config), args.samples)
+
+    print(f"Measured verify time: {measured:.1f} ms (target {args.target_ms:.0f} ms)")
+    print(f"PASSWORD_HASH_SCHEME={config['scheme']}")
+    if config["scheme"] == "argon2":
+        print(f"ARGON2_TIME_COST={config['argon2_time_cost']}")
+        print(f"ARGON2_MEMORY_COST={config['argon2_memory_cost']}")
+        print(f"ARGON2_PARALLELISM={config['argon2_parallelism']}")
+    else:
+        print(f"BCRYPT_ROUNDS={config['bcrypt_rounds']}")
+
+if __name__ == "__main__":
+    main()
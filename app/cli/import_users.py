@@ -0,0 +1,77 @@
+# Imports users from an NDJSON or CSV file (columns: email, password or password_hash, username, currency).
+#   python -m app.cli.import_users users.ndjson --workers 8 --errors-file import-errors.ndjson
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.api.admin.import_services import PARSERS, ImportReport, hash_many, import_users, iter_lines
+from app.config.settings import IMPORT_BATCH_SIZE
+from app.db.database import dispose_engine
+from app.utils.token_utils import configure_password_hashing, password_hash_config
+
+async def read_file(path: str, chunk_size: int = 1 << 20):
+    with open(path, "rb") as f:
+        while True:
+            chunk = await asyncio.to_thread(f.read, chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+async def run(args):
+    # A dedicated process pool uses every core; passwords are sent in chunks to keep IPC overhead low
+    executor = ProcessPoolExecutor(
+        max_workers=args.workers,
+        initializer=configure_password_hashing,
+        initargs=(password_hash_config,),
+    )
+    loop = asyncio.get_running_loop()
+    chunk_size = max(1, args.batch_size // (args.workers * 4))
+
+    async def hash_passwords(passwords):
+        chunks = [passwords[i:i + chunk_size] for i in range(0, len(passwords), chunk_size)]
+        results = await asyncio.gather(*(loop.run_in_executor(executor, hash_many, chunk) for chunk in chunks))
+        return [hashed for chunk in results for hashed in chunk]
+
+    started = time.perf_counter()
+
+    def progress(report):
+        rate = (report.imported + report.failed) / (time.perf_counter() - started)
+        print(f"batch {report.batches}: {report.imported} imported, {report.failed} failed ({rate:.0f} rows/s)",
+              file=sys.stderr)
+
+    errors_file = open(args.errors_file, "w") if args.errors_file else None
+    report = ImportReport()
+    if errors_file:
+        # Every error goes to the file instead of the (capped) in-memory list
+        report.error_sink = lambda error: errors_file.write(json.dumps(error) + "\n")
+
+    fmt = args.format or ("csv" if args.path.endswith(".csv") else "ndjson")
+    try:
+        rows = PARSERS[fmt](iter_lines(read_file(args.path)))
+        await import_users(rows, batch_size=args.batch_size, hash_passwords=hash_passwords,
+                           on_batch=progress, report=report)
+    finally:
+        executor.shutdown()
+        await dispose_engine()
+        if errors_file:
+            errors_file.close()
+
+    print(json.dumps(report.as_dict(), indent=2))
+    return 1 if report.failed else 0
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk import users")
+    parser.add_argument("path")
+    parser.add_argument("--format", choices=sorted(PARSERS))
+    parser.add_argument("--batch-size", type=int, default=IMPORT_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="hashing processes")
+    parser.add_argument("--errors-file", help="write every per-row error here as NDJSON")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+if __name__ == "__main__":
+    main()
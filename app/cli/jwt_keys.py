@@ -0,0 +1,67 @@
+# Manages the access-token signing keys in JWT_KEYS_DIR.
+#   python -m app.cli.jwt_keys generate --algorithm EdDSA
+#   python -m app.cli.jwt_keys retire <kid>
+#   python -m app.cli.jwt_keys list
+import argparse
+import os
+import secrets
+from datetime import datetime
+
+from app.config.settings import JWT_ACCESS_ALGORITHM, JWT_ACTIVE_KID, JWT_KEYS_DIR
+from app.utils.jwt_keys import (ASYMMETRIC_ALGORITHMS, PRIVATE_KEY_SUFFIX, PUBLIC_KEY_SUFFIX,
+                                generate_private_key, key_algorithm, private_key_pem, public_key_pem, read_keys)
+
+def generate(keys_dir: str, algorithm: str):
+    os.makedirs(keys_dir, exist_ok=True)
+    kid = f"{datetime.utcnow():%Y%m%d}-{secrets.token_hex(4)}"
+    path = os.path.join(keys_dir, kid + PRIVATE_KEY_SUFFIX)
+    # Private keys are only readable by the owner
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, "wb") as f:
+        f.write(private_key_pem(generate_private_key(algorithm)))
+    print(f"Wrote {path}")
+    print("The key is published in the JWKS from the next restart. Once JWKS caches have refreshed")
+    print(f"(JWKS_MAX_AGE_SECONDS), start signing with it: JWT_ACTIVE_KID={kid}")
+
+def retire(keys_dir: str, kid: str):
+    if kid == JWT_ACTIVE_KID:
+        raise SystemExit(f"{kid} is still JWT_ACTIVE_KID")
+    private_keys, _ = read_keys(keys_dir)
+    if kid not in private_keys:
+        raise SystemExit(f"No private key {kid} in {keys_dir}")
+    # Keep publishing the public half so tokens it already signed verify until they expire
+    with open(os.path.join(keys_dir, kid + PUBLIC_KEY_SUFFIX), "wb") as f:
+        f.write(public_key_pem(private_keys[kid].public_key()))
+    os.remove(os.path.join(keys_dir, kid + PRIVATE_KEY_SUFFIX))
+    print(f"Retired {kid}; delete {kid}{PUBLIC_KEY_SUFFIX} once the tokens it signed have expired")
+
+def list_keys(keys_dir: str):
+    private_keys, public_keys = read_keys(keys_dir)
+    for kid, key in public_keys.items():
+        state = "retired" if kid not in private_keys else "active" if kid == JWT_ACTIVE_KID else "published"
+        print(f"{kid}\t{key_algorithm(key)}\t{state}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage access-token signing keys")
+    parser.add_argument("--keys-dir", default=JWT_KEYS_DIR)
+    commands = parser.add_subparsers(dest="command", required=True)
+    generate_parser = commands.add_parser("generate", help="create a new private key")
+    generate_parser.add_argument(
+        "--algorithm",
+        choices=ASYMMETRIC_ALGORITHMS,
+        default=JWT_ACCESS_ALGORITHM if JWT_ACCESS_ALGORITHM in ASYMMETRIC_ALGORITHMS else "EdDSA",
+    )
+    retire_parser = commands.add_parser("retire", help="stop signing with a key but keep publishing it")
+    retire_parser.add_argument("kid")
+    commands.add_parser("list", help="show the keys and their state")
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        generate(args.keys_dir, args.algorithm)
+    elif args.command == "retire":
+        retire(args.keys_dir, args.kid)
+    else:
+        list_keys(args.keys_dir)
+
+if __name__ == "__main__":
+    main()
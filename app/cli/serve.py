@@ -0,0 +1,140 @@
+# Production launcher: one process per core, each with its share of the cores for password hashing.
+#   python -m app.cli.serve --bind 0.0.0.0:8000 --workers 4
+# Runs gunicorn with uvicorn workers when gunicorn is installed (pip install -r requirements-server.txt),
+# otherwise uvicorn's own process manager. uvloop and httptools are used when installed.
+import argparse
+import glob
+import logging
+import os
+
+# Read here rather than in app.config.settings: the hash pool size below has to be exported before settings
+# are first imported, both in this process (which preloads the app) and in the workers
+SERVER_BIND = os.getenv("SERVER_BIND", "0.0.0.0:8000")
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", os.getenv("WEB_CONCURRENCY", os.cpu_count() or 1)))
+# How long SIGTERM waits for in-flight requests before workers are killed; covers a login that queued
+# for the hash pool (HASH_QUEUE_MAX_WAIT_SECONDS) and then hashed
+SERVER_GRACEFUL_TIMEOUT = int(os.getenv("SERVER_GRACEFUL_TIMEOUT", 30))
+SERVER_KEEPALIVE_SECONDS = int(os.getenv("SERVER_KEEPALIVE_SECONDS", 5))
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", 2048))
+
+logger = logging.getLogger("app.cli.serve")
+
+def hash_pool_size(workers: int) -> int:
+    # bcrypt holds a core per hash; N workers each sized to the whole machine would oversubscribe it N times
+    return max(1, (os.cpu_count() or 1) // workers)
+
+def module_available(name: str) -> bool:
+    try:
+        __import__(name)
+    except ImportError:
+        return False
+    return True
+
+def reset_prometheus_multiproc_dir():
+    # Samples left by a previous run's workers would otherwise be reported forever
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if not path:
+        return
+    os.makedirs(path, exist_ok=True)
+    for name in glob.glob(os.path.join(path, "*.db")):
+        os.remove(name)
+
+def preload_app():
+    # Runs once before the workers fork, so they share the imported code and agree on the hashing cost.
+    # Connections (database, Redis, hash pool) are only ever opened from the lifespan, i.e. per worker.
+    from main import app
+    from app.utils.breached_passwords import get_breached_password_filter
+    from app.utils.jwt_keys import get_key_set
+    from app.utils.token_utils import calibrate_password_hashing
+
+    calibrate_password_hashing()
+    get_key_set()
+    # Mapped before forking; the workers share the pages either way, this only fails a bad file early
+    get_breached_password_filter()
+    return app
+
+if module_available("gunicorn"):
+    from uvicorn.workers import UvicornWorker
+
+    class Worker(UvicornWorker):
+        # "on" makes a failing startup (e.g. bad signing keys) stop the worker instead of serving
+        CONFIG_KWARGS = {"loop": "auto", "http": "auto", "lifespan": "on"}
+
+def run_gunicorn(args):
+    from gunicorn.app.base import BaseApplication
+
+    def child_exit(server, worker):
+        if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+            from prometheus_client import multiprocess
+            multiprocess.mark_process_dead(worker.pid)
+
+    options = {
+        "bind": args.bind,
+        "workers": args.workers,
+        "worker_class": "app.cli.serve.Worker",
+        "preload_app": True,
+        "graceful_timeout": args.graceful_timeout,
+        "timeout": args.graceful_timeout,
+        "keepalive": SERVER_KEEPALIVE_SECONDS,
+        "backlog": SERVER_BACKLOG,
+        "child_exit": child_exit,
+    }
+    if os.path.isdir("/dev/shm"):
+        # Worker heartbeats on a disk-backed tmp dir can stall and get healthy workers killed
+        options["worker_tmp_dir"] = "/dev/shm"
+
+    class Server(BaseApplication):
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            return preload_app()
+
+    Server().run()
+
+def run_uvicorn(args):
+    import uvicorn
+
+    host, _, port = args.bind.rpartition(":")
+    # Workers are spawned and import the app themselves, so there is nothing to preload
+    uvicorn.run(
+        "main:app",
+        host=host or "0.0.0.0",
+        port=int(port),
+        workers=args.workers,
+        loop="auto",
+        http="auto",
+        lifespan="on",
+        timeout_keep_alive=SERVER_KEEPALIVE_SECONDS,
+        backlog=SERVER_BACKLOG,
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the API with one worker process per core")
+    parser.add_argument("--bind", default=SERVER_BIND, help="host:port")
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS)
+    parser.add_argument("--graceful-timeout", type=int, default=SERVER_GRACEFUL_TIMEOUT, help="seconds")
+    parser.add_argument("--server", choices=["auto", "gunicorn", "uvicorn"], default="auto")
+    args = parser.parse_args()
+
+    # Before anything imports app.config.settings; an explicit HASH_POOL_WORKERS still wins
+    os.environ.setdefault("HASH_POOL_WORKERS", str(hash_pool_size(args.workers)))
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s [%(process)d] %(levelname)s %(name)s: %(message)s")
+    reset_prometheus_multiproc_dir()
+
+    server = args.server
+    if server == "auto":
+        server = "gunicorn" if module_available("gunicorn") else "uvicorn"
+    logger.info(
+        "Starting %d %s workers on %s, %s hash pool threads each (uvloop: %s, httptools: %s)",
+        args.workers, server, args.bind, os.environ["HASH_POOL_WORKERS"],
+        module_available("uvloop"), module_available("httptools"),
+    )
+    if server == "gunicorn":
+        run_gunicorn(args)
+    else:
+        run_uvicorn(args)
+
+if __name__ == "__main__":
+    main()
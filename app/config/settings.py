@@ -7,16 +7,108 @@ ACCESS_TOKEN_EXPIRE_MINUTES = 30
 REFRESH_TOKEN_EXPIRE_MINUTES = 60 * 24 * 7
 
 DATABASE_URL = os.getenv("DATABASE_URL")
+
+# Database connection pool (per worker process)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 5))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 10))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", 30))
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "true").lower() in ("1", "true", "yes")
 JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 JWT_REFRESH_SECRET_KEY = os.getenv("JWT_REFRESH_SECRET_KEY")
 
+# Access tokens: HS256 with JWT_SECRET_KEY, or EdDSA / ES256 with the keys in JWT_KEYS_DIR so other
+# services can verify them from /.well-known/jwks.json (see app/utils/jwt_keys.py for rotation)
+JWT_ACCESS_ALGORITHM = os.getenv("JWT_ACCESS_ALGORITHM", ALGORITHM)
+JWT_KEYS_DIR = os.getenv("JWT_KEYS_DIR", "keys")
+JWT_ACTIVE_KID = os.getenv("JWT_ACTIVE_KID")
+JWKS_MAX_AGE_SECONDS = int(os.getenv("JWKS_MAX_AGE_SECONDS", 3600))
+
 # SendGrid settings
 SENDGRID_API_KEY = os.getenv("SENDGRID_API_KEY")
 EMAIL_FROM = os.getenv("EMAIL_FROM")
 
+# Email outbox: reset emails are queued on a Redis stream and delivered by the email worker
+EMAIL_TRANSPORT = os.getenv("EMAIL_TRANSPORT", "sendgrid")  # sendgrid, file or memory
+EMAIL_FILE_TRANSPORT_DIR = os.getenv("EMAIL_FILE_TRANSPORT_DIR", "outbox")
+EMAIL_WORKER_ENABLED = os.getenv("EMAIL_WORKER_ENABLED", "true").lower() in ("1", "true", "yes")
+EMAIL_OUTBOX_MAXLEN = int(os.getenv("EMAIL_OUTBOX_MAXLEN", 100000))
+# Undeliverable emails kept for inspection (without their reset links)
+EMAIL_DEAD_LETTER_MAXLEN = int(os.getenv("EMAIL_DEAD_LETTER_MAXLEN", 10000))
+EMAIL_BATCH_SIZE = int(os.getenv("EMAIL_BATCH_SIZE", 50))
+EMAIL_SEND_CONCURRENCY = int(os.getenv("EMAIL_SEND_CONCURRENCY", 10))
+EMAIL_MAX_ATTEMPTS = int(os.getenv("EMAIL_MAX_ATTEMPTS", 5))
+EMAIL_RETRY_BACKOFF_SECONDS = float(os.getenv("EMAIL_RETRY_BACKOFF_SECONDS", 1))
+EMAIL_BLOCK_MS = int(os.getenv("EMAIL_BLOCK_MS", 5000))
+# Entries a crashed worker left unacknowledged are taken over after this idle time
+EMAIL_CLAIM_IDLE_MS = int(os.getenv("EMAIL_CLAIM_IDLE_MS", 300000))
+
+# Verified JWT claims cache (per worker), entries are evicted at the token's exp
+VERIFIED_TOKEN_CACHE_SIZE = int(os.getenv("VERIFIED_TOKEN_CACHE_SIZE", 10000))
+
+# User lookup cache: per-worker LRU in front of Redis; writes invalidate both tiers
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_LOCAL_TTL_SECONDS = float(os.getenv("USER_CACHE_LOCAL_TTL_SECONDS", 30))
+USER_CACHE_TTL_SECONDS = int(os.getenv("USER_CACHE_TTL_SECONDS", 300))
+# After an invalidation the user is not cached again for this long, which must exceed the time between a
+# reader's database query and its cache fill
+USER_CACHE_TOMBSTONE_SECONDS = int(os.getenv("USER_CACHE_TOMBSTONE_SECONDS", 10))
+
+# Where issued sessions live: "sql" (the token table, purged by the cleanup job) or "redis"
+# (records expire with the tokens, so no cleanup and no token writes on the database)
+TOKEN_STORE_BACKEND = os.getenv("TOKEN_STORE_BACKEND", "sql")
+
+# Per-user token generation ("log out everywhere"): cached in Redis, and per worker for a few seconds,
+# which bounds how long a bump takes to reach every worker
+TOKEN_GENERATION_CACHE_SIZE = int(os.getenv("TOKEN_GENERATION_CACHE_SIZE", 10000))
+TOKEN_GENERATION_LOCAL_TTL_SECONDS = float(os.getenv("TOKEN_GENERATION_LOCAL_TTL_SECONDS", 2))
+TOKEN_GENERATION_TTL_SECONDS = int(os.getenv("TOKEN_GENERATION_TTL_SECONDS", 86400))
+
+# Admin API (bulk user import); the admin routes are disabled when no key is set
+ADMIN_API_KEY = os.getenv("ADMIN_API_KEY")
+IMPORT_BATCH_SIZE = int(os.getenv("IMPORT_BATCH_SIZE", 1000))
+IMPORT_MAX_REPORTED_ERRORS = int(os.getenv("IMPORT_MAX_REPORTED_ERRORS", 1000))
+
+# Redis settings
+REDIS_HOST = os.getenv("REDIS_HOST")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_PASSWORD = os.getenv("REDIS_PASSWORD")
+REDIS_SSL = os.getenv("REDIS_SSL", "true").lower() in ("1", "true", "yes")
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", 50))
+
+# Rate limiting (requests allowed per time window in seconds, per client IP)
+REGISTER_RATE_LIMIT = int(os.getenv("REGISTER_RATE_LIMIT", 1))
+REGISTER_RATE_LIMIT_TIME = int(os.getenv("REGISTER_RATE_LIMIT_TIME", 3600))
+FORGOT_PASSWORD_RATE_LIMIT = int(os.getenv("FORGOT_PASSWORD_RATE_LIMIT", 5))
+FORGOT_PASSWORD_RATE_LIMIT_TIME = int(os.getenv("FORGOT_PASSWORD_RATE_LIMIT_TIME", 3600))
+# Each worker leases up to this many requests per key from Redis (never more than a tenth of the limit)
+# and serves them locally for RATE_LIMIT_LEASE_SECONDS; unused ones are handed back on the next sync
+RATE_LIMIT_LEASE_SIZE = int(os.getenv("RATE_LIMIT_LEASE_SIZE", 10))
+RATE_LIMIT_LEASE_SECONDS = float(os.getenv("RATE_LIMIT_LEASE_SECONDS", 1))
+RATE_LIMIT_LOCAL_CACHE_SIZE = int(os.getenv("RATE_LIMIT_LOCAL_CACHE_SIZE", 10000))
+# Redis calls slower than the budget count as failures; after RATE_LIMIT_BREAKER_FAILURES in a row the
+# limiters run per worker only, and Redis is retried every RATE_LIMIT_BREAKER_RESET_SECONDS
+RATE_LIMIT_REDIS_TIMEOUT_MS = float(os.getenv("RATE_LIMIT_REDIS_TIMEOUT_MS", 250))
+RATE_LIMIT_BREAKER_FAILURES = int(os.getenv("RATE_LIMIT_BREAKER_FAILURES", 5))
+RATE_LIMIT_BREAKER_RESET_SECONDS = float(os.getenv("RATE_LIMIT_BREAKER_RESET_SECONDS", 10))
+
+# Failed logins: after the threshold, each further failure doubles the lockout for that email or IP,
+# starting at LOGIN_LOCKOUT_BASE_SECONDS and capped at LOGIN_LOCKOUT_MAX_SECONDS. Counters are
+# forgotten LOGIN_FAILURE_WINDOW_SECONDS after the last failure; a successful login clears the email's.
+LOGIN_EMAIL_FAILURE_THRESHOLD = int(os.getenv("LOGIN_EMAIL_FAILURE_THRESHOLD", 5))
+LOGIN_IP_FAILURE_THRESHOLD = int(os.getenv("LOGIN_IP_FAILURE_THRESHOLD", 20))
+LOGIN_LOCKOUT_BASE_SECONDS = float(os.getenv("LOGIN_LOCKOUT_BASE_SECONDS", 1))
+LOGIN_LOCKOUT_MAX_SECONDS = float(os.getenv("LOGIN_LOCKOUT_MAX_SECONDS", 900))
+LOGIN_FAILURE_WINDOW_SECONDS = int(os.getenv("LOGIN_FAILURE_WINDOW_SECONDS", 900))
+LOGIN_THROTTLE_CACHE_SIZE = int(os.getenv("LOGIN_THROTTLE_CACHE_SIZE", 10000))
+
+# Token revocation near-cache: revoked entries live until the token expires,
+# "not revoked" answers are only trusted for a few seconds so other workers' logouts propagate
+REVOCATION_CACHE_SIZE = int(os.getenv("REVOCATION_CACHE_SIZE", 10000))
+REVOCATION_NEGATIVE_TTL_SECONDS = float(os.getenv("REVOCATION_NEGATIVE_TTL_SECONDS", 2))
+
 SERVER_URL = os.getenv("SERVER_URL")
 FRONT_END_URL = os.getenv("FRONT_END_URL")
-CLEANUP_ROUTE = "/cleanup-tokens"
 
 # CORS settings
 ALLOWED_ORIGINS = [
@@ -25,3 +117,29 @@ ALLOWED_ORIGINS = [
 
 # Other settings
 CLEANUP_INTERVAL_HOURS = 24
+CLEANUP_SCHEDULER_ENABLED = os.getenv("CLEANUP_SCHEDULER_ENABLED", "true").lower() in ("1", "true", "yes")
+CLEANUP_BATCH_SIZE = int(os.getenv("CLEANUP_BATCH_SIZE", 5000))
+CLEANUP_BATCH_PAUSE_SECONDS = float(os.getenv("CLEANUP_BATCH_PAUSE_SECONDS", 0.1))
+
+# Password hashing: "bcrypt" or "argon2". Stored hashes using another scheme or cost are
+# upgraded on the next successful login.
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt")
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", 12))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", 3))
+ARGON2_MEMORY_COST = int(os.getenv("ARGON2_MEMORY_COST", 65536))  # KiB
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", 1))
+# When set, the cost is calibrated at startup to this verify time (prefer `python -m app.cli.calibrate_hashing`
+# and fixed settings so every node agrees); calibrated costs only ever upgrade stored hashes
+PASSWORD_HASH_TARGET_MS = float(os.getenv("PASSWORD_HASH_TARGET_MS")) if os.getenv("PASSWORD_HASH_TARGET_MS") else None
+
+# Password hashing pool ("thread" or "process"); bcrypt releases the GIL so threads scale across cores
+HASH_POOL_KIND = os.getenv("HASH_POOL_KIND", "thread")
+HASH_POOL_WORKERS = int(os.getenv("HASH_POOL_WORKERS", os.cpu_count() or 1))
+# Hashing requests beyond the pool size wait in a bounded queue; when it is full, or a request has
+# waited HASH_QUEUE_MAX_WAIT_SECONDS, the request gets 503 with Retry-After
+HASH_QUEUE_SIZE = int(os.getenv("HASH_QUEUE_SIZE", HASH_POOL_WORKERS * 4))
+HASH_QUEUE_MAX_WAIT_SECONDS = float(os.getenv("HASH_QUEUE_MAX_WAIT_SECONDS", 2))
+
+# Bloom filter of breached password SHA-1s built by `python -m app.cli.breached_passwords build`;
+# new passwords found in it are rejected. Unset disables the check.
+BREACHED_PASSWORD_FILTER_PATH = os.getenv("BREACHED_PASSWORD_FILTER_PATH")
@@ -1,26 +1,83 @@
-import os
+import time
 
-from dotenv import load_dotenv
-from sqlalchemy import create_engine
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
-load_dotenv()
-#Postgres connection url
-DATABASE_URL = os.getenv("DATABASE_URL")
+from app.config.settings import (DATABASE_URL, DB_MAX_OVERFLOW, DB_POOL_PRE_PING, DB_POOL_RECYCLE,
+                                 DB_POOL_SIZE, DB_POOL_TIMEOUT)
+from app.utils.metrics import PHASE_LATENCY
 
-# Create the PostgreSQL engine
-engine = create_engine(DATABASE_URL)
+def get_async_database_url(url: str) -> str:
+    # Plain postgres URLs are rewritten to use the asyncpg driver
+    for prefix in ("postgresql://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql+asyncpg://" + url[len(prefix):]
+    return url
+
+def get_engine_options(url: str) -> dict:
+    # SQLite (used for local runs) does not support a sized queue pool
+    if url.startswith("sqlite"):
+        return {}
+    return {
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_timeout": DB_POOL_TIMEOUT,
+    }
+
+# Time every statement, labelled by its kind (db_select, db_insert, ...)
+QUERY_PHASES = {"select": "db_select", "insert": "db_insert", "update": "db_update", "delete": "db_delete"}
+
+def _start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _record_query_time(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    phase = QUERY_PHASES.get(statement.lstrip()[:6].lower(), "db_other")
+    PHASE_LATENCY.labels(phase).observe(time.perf_counter() - started)
+
+def _record_failed_query(context):
+    # Failed statements never reach after_cursor_execute; without this their start time stays on the
+    # pooled connection (e.g. every duplicate registration's IntegrityError)
+    conn = context.connection
+    if conn is None or context.execution_context is None:
+        return
+    stack = conn.info.get("query_started")
+    if stack:
+        PHASE_LATENCY.labels("db_error").observe(time.perf_counter() - stack.pop())
 
 # Create declarative base
 Base = declarative_base()
 
-# Create session
-SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
+# The engine is created on first use (normally from the app lifespan) so importing the app
+# never needs a database URL or loads the driver
+engine = None
+_session_factory = sessionmaker(class_=AsyncSession, expire_on_commit=False)
+
+def get_engine():
+    global engine
+    if engine is None:
+        url = get_async_database_url(DATABASE_URL)
+        engine = create_async_engine(url, **get_engine_options(url))
+        event.listen(engine.sync_engine, "before_cursor_execute", _start_query_timer)
+        event.listen(engine.sync_engine, "after_cursor_execute", _record_query_time)
+        event.listen(engine.sync_engine, "handle_error", _record_failed_query)
+        _session_factory.configure(bind=engine)
+    return engine
+
+async def dispose_engine():
+    global engine
+    if engine is not None:
+        await engine.dispose()
+        engine = None
+
+def SessionLocal() -> AsyncSession:
+    get_engine()
+    return _session_factory()
 
-def get_session():
-    session = SessionLocal()
-    try:
+async def get_session():
+    async with SessionLocal() as session:
         yield session
-    finally:
-        session.close()
\ No newline at end of file
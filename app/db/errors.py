@@ -0,0 +1,20 @@
+from typing import Optional
+
+from sqlalchemy import Table
+from sqlalchemy.exc import IntegrityError
+
+def violated_constraint(error: IntegrityError, table: Table) -> Optional[str]:
+    # Name of the constraint or unique index on `table` that the statement violated, if it was one of them
+    orig = error.orig
+    # asyncpg (wrapped by SQLAlchemy's adapter) and psycopg2 report it directly
+    for source in (getattr(orig, "__cause__", None), getattr(orig, "diag", None)):
+        name = getattr(source, "constraint_name", None)
+        if name:
+            return name
+    # SQLite names expression indexes in the message, and only the columns of other constraints
+    message = str(orig)
+    for constraint in [*table.constraints, *table.indexes]:
+        columns = ", ".join(f"{table.name}.{column.name}" for column in constraint.columns)
+        if constraint.name and (f"'{constraint.name}'" in message or (columns and message.endswith(columns))):
+            return constraint.name
+    return None
@@ -1,19 +1,45 @@
-from sqlalchemy import Column, Integer, String, Float, ForeignKey, DateTime, Boolean
+from sqlalchemy import (Column, Integer, String, Float, ForeignKey, DateTime, Boolean, Index, LargeBinary,
+                        UniqueConstraint, func)
 from app.db.database import Base
 import datetime
 
+# Unique constraint names on users, used to tell which one a failed INSERT or UPDATE violated
+USERS_USERNAME_CONSTRAINT = "users_username_key"
+USERS_EMAIL_INDEX = "uq_users_email_lower"
+
 class User(Base):
     __tablename__ = "users"
     user_id = Column(Integer, primary_key=True, autoincrement=True)
-    username = Column(String(100), unique=True, nullable=False)
+    username = Column(String(100), nullable=False)
     password = Column(String(100), nullable=False)
-    email = Column(String(100), unique=True, nullable=False)
+    # Stored normalized (app.utils.validators.normalize_email)
+    email = Column(String(100), nullable=False)
     currency = Column(String(3), nullable=False, default='EUR')
+    # Bumped to revoke every token issued to the user (app.utils.token_generation)
+    token_generation = Column(Integer, nullable=False, default=0, server_default="0")
+
+    __table_args__ = (
+        UniqueConstraint("username", name=USERS_USERNAME_CONSTRAINT),
+        # Case-insensitive; get_user_by_email filters on lower(email) so lookups use it too
+        Index(USERS_EMAIL_INDEX, func.lower(email), unique=True),
+    )
 
 class TokenTable(Base):
     __tablename__ = "token"
-    user_id = Column(Integer)
-    access_token = Column(String(450), primary_key=True)
-    refresh_token = Column(String(450),nullable=False)
-    status = Column(Boolean)
-    created_date = Column(DateTime, default=datetime.datetime.now)
\ No newline at end of file
+    # Tokens are stored as SHA-256 digests (app.utils.digest.token_digest), never as raw JWTs
+    access_token_hash = Column(LargeBinary(32), primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    refresh_token_hash = Column(LargeBinary(32), nullable=False)
+    # Refresh token replaced by the last rotation; presenting it again means the session was stolen
+    previous_refresh_token_hash = Column(LargeBinary(32))
+    status = Column(Boolean, nullable=False, default=True)
+    created_date = Column(DateTime, default=datetime.datetime.now)
+    # UTC time after which neither token in the row can be used; cleanup deletes by this
+    expires_at = Column(DateTime, nullable=False)
+
+    __table_args__ = (
+        Index("ix_token_user_id_status", "user_id", "status"),
+        Index("ix_token_expires_at", "expires_at"),
+        Index("ix_token_refresh_token_hash", "refresh_token_hash"),
+        Index("ix_token_previous_refresh_token_hash", "previous_refresh_token_hash"),
+    )
\ No newline at end of file
@@ -32,6 +32,9 @@ class TokenSchema(BaseModel):
     access_token: str
     refresh_token: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class TokenCreate(BaseModel):
     user_id: str
     access_token: str
@@ -0,0 +1,303 @@
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.settings import TOKEN_STORE_BACKEND
+from app.db.database import SessionLocal
+from app.db.models import TokenTable
+from app.utils.rate_limit import load_script
+from app.utils.redis_client import get_redis
+
+# Issued sessions (access/refresh token digests from app.utils.digest.token_digest), kept in the
+# database or in Redis depending on TOKEN_STORE_BACKEND. Writes to the SQL store join the caller's
+# transaction, so callers always commit `db` afterwards; the Redis store writes immediately.
+
+@dataclass
+class TokenRecord:
+    user_id: int
+    status: bool
+    expires_at: datetime
+
+class TokenStore(ABC):
+    # Whether expired records pile up and need perform_token_cleanup
+    needs_cleanup = False
+
+    @abstractmethod
+    async def add(self, db: AsyncSession, user_id: int, access_digest: bytes, refresh_digest: bytes,
+                  expires_at: datetime):
+        raise NotImplementedError
+
+    @abstractmethod
+    async def get(self, db: AsyncSession, access_digest: bytes) -> Optional[TokenRecord]:
+        raise NotImplementedError
+
+    @abstractmethod
+    async def deactivate(self, db: AsyncSession, access_digest: bytes, user_id: int = None) -> bool:
+        # False when there is no such token (for that user)
+        raise NotImplementedError
+
+    @abstractmethod
+    async def rotate(self, db: AsyncSession, user_id: int, refresh_digest: bytes, new_access_digest: bytes,
+                     new_refresh_digest: bytes, expires_at: datetime) -> bool:
+        # Replaces an active session's token pair; False when the refresh token is not current
+        raise NotImplementedError
+
+    @abstractmethod
+    async def deactivate_reused(self, db: AsyncSession, user_id: int, refresh_digest: bytes) -> Optional[bytes]:
+        # Ends the session whose previous refresh token this was; returns its current access digest
+        raise NotImplementedError
+
+    @abstractmethod
+    async def delete_user_tokens(self, db: AsyncSession, user_id: int):
+        raise NotImplementedError
+
+    async def delete_expired(self, cutoff: datetime, batch_size: int) -> int:
+        return 0
+
+class SqlTokenStore(TokenStore):
+    needs_cleanup = True
+
+    async def add(self, db, user_id, access_digest, refresh_digest, expires_at):
+        db.add(TokenTable(
+            user_id=user_id,
+            access_token_hash=access_digest,
+            refresh_token_hash=refresh_digest,
+            status=True,
+            expires_at=expires_at,
+        ))
+
+    async def get(self, db, access_digest):
+        token = await db.get(TokenTable, access_digest)
+        if token is None:
+            return None
+        return TokenRecord(user_id=token.user_id, status=token.status, expires_at=token.expires_at)
+
+    async def deactivate(self, db, access_digest, user_id=None):
+        # Single primary-key update instead of a lookup followed by a write
+        condition = [TokenTable.access_token_hash == access_digest]
+        if user_id is not None:
+            condition.append(TokenTable.user_id == user_id)
+        result = await db.execute(update(TokenTable).where(*condition).values(status=False))
+        return bool(result.rowcount)
+
+    async def rotate(self, db, user_id, refresh_digest, new_access_digest, new_refresh_digest, expires_at):
+        # One indexed UPDATE, no new row
+        result = await db.execute(
+            update(TokenTable)
+            .where(
+                TokenTable.refresh_token_hash == refresh_digest,
+                TokenTable.user_id == user_id,
+                TokenTable.status == True,
+                TokenTable.expires_at > datetime.utcnow(),
+            )
+            .values(
+                access_token_hash=new_access_digest,
+                refresh_token_hash=new_refresh_digest,
+                previous_refresh_token_hash=refresh_digest,
+                expires_at=expires_at,
+            )
+        )
+        return bool(result.rowcount)
+
+    async def deactivate_reused(self, db, user_id, refresh_digest):
+        result = await db.execute(
+            select(TokenTable.access_token_hash)
+            .where(
+                TokenTable.previous_refresh_token_hash == refresh_digest,
+                TokenTable.user_id == user_id,
+                TokenTable.status == True,
+            )
+        )
+        access_digest = result.scalar_one_or_none()
+        if access_digest is not None:
+            await self.deactivate(db, access_digest)
+        return access_digest
+
+    async def delete_user_tokens(self, db, user_id):
+        await db.execute(delete(TokenTable).where(TokenTable.user_id == user_id))
+
+    async def delete_expired(self, cutoff, batch_size):
+        # Each batch is its own short transaction; rows locked by in-flight logins are skipped, not waited on
+        doomed = (
+            select(TokenTable.access_token_hash)
+            .where(TokenTable.expires_at < cutoff)
+            .order_by(TokenTable.expires_at)
+            .limit(batch_size)
+            .with_for_update(skip_locked=True)
+        )
+        async with SessionLocal() as db:
+            result = await db.execute(
+                delete(TokenTable)
+                .where(TokenTable.access_token_hash.in_(doomed))
+                .execution_options(synchronize_session=False)
+            )
+            await db.commit()
+        return result.rowcount
+
+# Redis layout, every key expiring with the session (PEXPIREAT its expires_at):
+#   token:<access hex>         hash: user_id, refresh (hex), status (1/0), expires_at (epoch ms) and, once
+#                              rotated, previous (hex of the refresh token it replaced)
+#   token:refresh:<hex>        access hex of the session this refresh token currently belongs to
+#   token:previous:<hex>       access hex of the session this refresh token was rotated out of; only the
+#                              latest one per session is kept, like previous_refresh_token_hash in SQL
+#   token:user:<user_id>       set of the user's access hexes, expiring with the last of them
+# The add, rotate and reused-refresh scripts build key names from values they read (the session a refresh
+# token points to, the members of a user's set), so not every key they touch is in KEYS. They need a single
+# Redis node (or a replicated primary); Redis Cluster would reject them.
+TOKEN_KEY_PREFIX = "token:"
+REFRESH_KEY_PREFIX = "token:refresh:"
+PREVIOUS_REFRESH_KEY_PREFIX = "token:previous:"
+USER_TOKENS_KEY_PREFIX = "token:user:"
+
+# Shared by the scripts below: write a session and index it
+_PUT_SESSION = """
+local function put_session(access, user_id, refresh, expires_at, now)
+    local record = 'token:' .. access
+    redis.call('HSET', record, 'user_id', user_id, 'refresh', refresh, 'status', 1, 'expires_at', expires_at)
+    redis.call('PEXPIREAT', record, expires_at)
+    redis.call('SET', 'token:refresh:' .. refresh, access)
+    redis.call('PEXPIREAT', 'token:refresh:' .. refresh, expires_at)
+    local user_key = 'token:user:' .. user_id
+    redis.call('SADD', user_key, access)
+    local ttl = redis.call('PTTL', user_key)
+    if ttl < 0 or now + ttl < tonumber(expires_at) then
+        redis.call('PEXPIREAT', user_key, expires_at)
+    end
+end
+"""
+
+ADD_SCRIPT = _PUT_SESSION + """
+-- Drop members whose sessions have expired so the set stays as small as the live sessions
+local user_key = 'token:user:' .. ARGV[2]
+for _, member in ipairs(redis.call('SMEMBERS', user_key)) do
+    if redis.call('EXISTS', 'token:' .. member) == 0 then
+        redis.call('SREM', user_key, member)
+    end
+end
+put_session(ARGV[1], ARGV[2], ARGV[3], ARGV[4], tonumber(ARGV[5]))
+return 1
+"""
+
+ROTATE_SCRIPT = _PUT_SESSION + """
+local old_refresh = ARGV[2]
+local access = redis.call('GET', 'token:refresh:' .. old_refresh)
+if not access then
+    return 0
+end
+local record = 'token:' .. access
+local session = redis.call('HMGET', record, 'user_id', 'status', 'previous')
+if session[1] ~= ARGV[1] or session[2] ~= '1' then
+    return 0
+end
+if session[3] then
+    redis.call('DEL', 'token:previous:' .. session[3])
+end
+redis.call('DEL', record, 'token:refresh:' .. old_refresh)
+redis.call('SREM', 'token:user:' .. ARGV[1], access)
+put_session(ARGV[3], ARGV[1], ARGV[4], ARGV[5], tonumber(ARGV[6]))
+redis.call('HSET', 'token:' .. ARGV[3], 'previous', old_refresh)
+redis.call('SET', 'token:previous:' .. old_refresh, ARGV[3])
+redis.call('PEXPIREAT', 'token:previous:' .. old_refresh, ARGV[5])
+return 1
+"""
+
+DEACTIVATE_SCRIPT = """
+local session = redis.call('HMGET', KEYS[1], 'user_id', 'status')
+if not session[1] or (ARGV[1] ~= '' and session[1] ~= ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'status', 0)
+return 1
+"""
+
+DEACTIVATE_REUSED_SCRIPT = """
+local access = redis.call('GET', KEYS[1])
+if not access then
+    return false
+end
+local record = 'token:' .. access
+local session = redis.call('HMGET', record, 'user_id', 'status')
+if session[1] ~= ARGV[1] or session[2] ~= '1' then
+    return false
+end
+redis.call('HSET', record, 'status', 0)
+return access
+"""
+
+def _epoch_ms(value: datetime) -> int:
+    # Stored datetimes are naive UTC
+    return int((value - datetime(1970, 1, 1)).total_seconds() * 1000)
+
+def _now_ms() -> int:
+    return _epoch_ms(datetime.utcnow())
+
+class RedisTokenStore(TokenStore):
+    # Records expire on their own, so nothing ever needs cleaning up
+    needs_cleanup = False
+
+    def __init__(self, redis=None):
+        self.redis = redis
+
+    def _client(self):
+        return self.redis or get_redis()
+
+    async def _run(self, source: str, keys, args):
+        client = self._client()
+        return await load_script(source, client)(keys=keys, args=args, client=client)
+
+    async def add(self, db, user_id, access_digest, refresh_digest, expires_at):
+        await self._run(ADD_SCRIPT, [], [access_digest.hex(), user_id, refresh_digest.hex(),
+                                         _epoch_ms(expires_at), _now_ms()])
+
+    async def get(self, db, access_digest):
+        session = await self._client().hgetall(TOKEN_KEY_PREFIX + access_digest.hex())
+        if not session:
+            return None
+        return TokenRecord(
+            user_id=int(session["user_id"]),
+            status=session["status"] == "1",
+            expires_at=datetime.utcfromtimestamp(int(session["expires_at"]) / 1000),
+        )
+
+    async def deactivate(self, db, access_digest, user_id=None):
+        keys = [TOKEN_KEY_PREFIX + access_digest.hex()]
+        return bool(await self._run(DEACTIVATE_SCRIPT, keys, ["" if user_id is None else user_id]))
+
+    async def rotate(self, db, user_id, refresh_digest, new_access_digest, new_refresh_digest, expires_at):
+        args = [user_id, refresh_digest.hex(), new_access_digest.hex(), new_refresh_digest.hex(),
+                _epoch_ms(expires_at), _now_ms()]
+        return bool(await self._run(ROTATE_SCRIPT, [], args))
+
+    async def deactivate_reused(self, db, user_id, refresh_digest):
+        keys = [PREVIOUS_REFRESH_KEY_PREFIX + refresh_digest.hex()]
+        access = await self._run(DEACTIVATE_REUSED_SCRIPT, keys, [user_id])
+        return bytes.fromhex(access) if access else None
+
+    async def delete_user_tokens(self, db, user_id):
+        client = self._client()
+        user_key = USER_TOKENS_KEY_PREFIX + str(user_id)
+        sessions = [TOKEN_KEY_PREFIX + member for member in await client.smembers(user_key)]
+        async with client.pipeline(transaction=False) as pipe:
+            for session in sessions:
+                pipe.hmget(session, "refresh", "previous")
+            linked = []
+            for refresh, previous in await pipe.execute():
+                if refresh:
+                    linked.append(REFRESH_KEY_PREFIX + refresh)
+                if previous:
+                    linked.append(PREVIOUS_REFRESH_KEY_PREFIX + previous)
+        await client.delete(user_key, *sessions, *linked)
+
+TOKEN_STORES = {"sql": SqlTokenStore, "redis": RedisTokenStore}
+
+_token_store: TokenStore = None
+
+def get_token_store() -> TokenStore:
+    global _token_store
+    if _token_store is None:
+        _token_store = TOKEN_STORES[TOKEN_STORE_BACKEND]()
+    return _token_store
@@ -0,0 +1,15 @@
+from app.config.settings import EMAIL_OUTBOX_MAXLEN
+from app.utils.redis_client import get_redis
+
+OUTBOX_STREAM = "email:outbox"
+DEAD_LETTER_STREAM = "email:dead"
+OUTBOX_GROUP = "email-senders"
+
+async def enqueue_email(template: str, to: str, **fields):
+    # One XADD; rendering and delivery happen in the email worker
+    await get_redis().xadd(
+        OUTBOX_STREAM,
+        {"template": template, "to": to, **fields},
+        maxlen=EMAIL_OUTBOX_MAXLEN,
+        approximate=True,
+    )
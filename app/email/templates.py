@@ -0,0 +1,25 @@
+import html
+import os
+from string import Template
+
+TEMPLATES_DIR = os.path.join(os.path.dirname(__file__), "templates")
+
+def _load(name: str) -> Template:
+    with open(os.path.join(TEMPLATES_DIR, name), encoding="utf-8") as f:
+        return Template(f.read())
+
+# Parsed once at import; rendering is a single substitution
+PASSWORD_RESET_TEMPLATE = _load("password_reset.html")
+PASSWORD_RESET_SUBJECT = "Password Reset"
+
+def render_password_reset(username: str, reset_link: str):
+    html_content = PASSWORD_RESET_TEMPLATE.substitute(
+        subject=PASSWORD_RESET_SUBJECT,
+        username=html.escape(username),
+        reset_link=html.escape(reset_link, quote=True),
+    )
+    return PASSWORD_RESET_SUBJECT, html_content
+
+RENDERERS = {
+    "password_reset": lambda fields: render_password_reset(fields["username"], fields["reset_link"]),
+}
@@ -0,0 +1,86 @@
+import asyncio
+import json
+import os
+from abc import ABC, abstractmethod
+from dataclasses import asdict, dataclass
+from typing import List
+
+from app.config.settings import (EMAIL_FILE_TRANSPORT_DIR, EMAIL_FROM, EMAIL_SEND_CONCURRENCY,
+                                 EMAIL_TRANSPORT, SENDGRID_API_KEY)
+
+@dataclass
+class EmailMessage:
+    to: str
+    subject: str
+    html_content: str
+    from_email: str = EMAIL_FROM
+
+class EmailTransport(ABC):
+    # Sends a batch and returns one success flag per message, in order
+    @abstractmethod
+    async def send_batch(self, messages: List[EmailMessage]) -> List[bool]:
+        raise NotImplementedError
+
+class SendGridTransport(EmailTransport):
+    def __init__(self, api_key: str = SENDGRID_API_KEY, concurrency: int = EMAIL_SEND_CONCURRENCY):
+        # Imported here so processes that never send mail don't pay for it
+        from sendgrid import SendGridAPIClient
+        self.client = SendGridAPIClient(api_key)
+        self.semaphore = asyncio.Semaphore(concurrency)
+
+    def _send(self, message: EmailMessage) -> bool:
+        from sendgrid.helpers.mail import Mail
+        mail = Mail(
+            from_email=message.from_email,
+            to_emails=message.to,
+            subject=message.subject,
+            html_content=message.html_content,
+        )
+        try:
+            response = self.client.send(mail)
+        except Exception:
+            return False
+        return response.status_code == 202
+
+    async def _send_one(self, message: EmailMessage) -> bool:
+        # The SendGrid client is blocking, keep it off the event loop
+        async with self.semaphore:
+            return await asyncio.to_thread(self._send, message)
+
+    async def send_batch(self, messages: List[EmailMessage]) -> List[bool]:
+        return list(await asyncio.gather(*(self._send_one(message) for message in messages)))
+
+class FileTransport(EmailTransport):
+    # Appends messages as JSON lines, for local development
+    def __init__(self, directory: str = EMAIL_FILE_TRANSPORT_DIR):
+        self.path = os.path.join(directory, "outbox.jsonl")
+        os.makedirs(directory, exist_ok=True)
+
+    def _write(self, messages: List[EmailMessage]):
+        with open(self.path, "a", encoding="utf-8") as f:
+            for message in messages:
+                f.write(json.dumps(asdict(message)) + "\n")
+
+    async def send_batch(self, messages: List[EmailMessage]) -> List[bool]:
+        await asyncio.to_thread(self._write, messages)
+        return [True] * len(messages)
+
+class MemoryTransport(EmailTransport):
+    # Keeps sent messages in a list, for tests and benchmarks
+    def __init__(self):
+        self.sent: List[EmailMessage] = []
+
+    async def send_batch(self, messages: List[EmailMessage]) -> List[bool]:
+        self.sent.extend(messages)
+        return [True] * len(messages)
+
+TRANSPORTS = {
+    "sendgrid": SendGridTransport,
+    "file": FileTransport,
+    "memory": MemoryTransport,
+}
+
+def get_transport(name: str = EMAIL_TRANSPORT) -> EmailTransport:
+    if name not in TRANSPORTS:
+        raise ValueError(f"Unknown email transport: {name}")
+    return TRANSPORTS[name]()
@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import os
+import socket
+
+from redis.exceptions import RedisError, ResponseError
+
+from app.config.settings import (EMAIL_BATCH_SIZE, EMAIL_BLOCK_MS, EMAIL_CLAIM_IDLE_MS, EMAIL_DEAD_LETTER_MAXLEN,
+                                 EMAIL_MAX_ATTEMPTS, EMAIL_RETRY_BACKOFF_SECONDS)
+from app.email.outbox import DEAD_LETTER_STREAM, OUTBOX_GROUP, OUTBOX_STREAM
+from app.email.templates import RENDERERS
+from app.email.transports import EmailMessage, EmailTransport, get_transport
+from app.utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+CONSUMER_NAME = f"{socket.gethostname()}:{os.getpid()}"
+# Live credentials are never copied to the dead-letter stream; the user can request a new reset email
+SECRET_FIELDS = ("reset_link",)
+# Cap on the wait between attempts while Redis is unreachable
+WORKER_MAX_BACKOFF_SECONDS = 30
+
+async def ensure_consumer_group(client):
+    try:
+        await client.xgroup_create(OUTBOX_STREAM, OUTBOX_GROUP, id="0", mkstream=True)
+    except ResponseError as e:
+        if "BUSYGROUP" not in str(e):
+            raise
+
+def build_message(fields: dict) -> EmailMessage:
+    subject, html_content = RENDERERS[fields["template"]](fields)
+    return EmailMessage(to=fields["to"], subject=subject, html_content=html_content)
+
+async def dead_letter(client, entry_id: str, fields: dict, reason: str):
+    kept = {name: value for name, value in fields.items() if name not in SECRET_FIELDS}
+    await client.xadd(
+        DEAD_LETTER_STREAM,
+        {**kept, "entry_id": entry_id, "reason": reason},
+        maxlen=EMAIL_DEAD_LETTER_MAXLEN,
+        approximate=True,
+    )
+    await client.xack(OUTBOX_STREAM, OUTBOX_GROUP, entry_id)
+    logger.error("Email %s moved to %s: %s", entry_id, DEAD_LETTER_STREAM, reason)
+
+async def process_batch(client, transport: EmailTransport, entries):
+    pending = []
+    for entry_id, fields in entries:
+        if fields is None:
+            # Trimmed from the stream before it could be delivered
+            await client.xack(OUTBOX_STREAM, OUTBOX_GROUP, entry_id)
+            continue
+        try:
+            pending.append((entry_id, fields, build_message(fields)))
+        except (KeyError, ValueError) as e:
+            await dead_letter(client, entry_id, fields, f"render failed: {e!r}")
+
+    attempt = 0
+    while pending:
+        results = await transport.send_batch([message for _, _, message in pending])
+        attempt += 1
+        sent = [entry_id for (entry_id, _, _), ok in zip(pending, results) if ok]
+        if sent:
+            await client.xack(OUTBOX_STREAM, OUTBOX_GROUP, *sent)
+        pending = [item for item, ok in zip(pending, results) if not ok]
+        if not pending:
+            break
+        if attempt >= EMAIL_MAX_ATTEMPTS:
+            for entry_id, fields, _ in pending:
+                await dead_letter(client, entry_id, fields, f"send failed after {attempt} attempts")
+            break
+        await asyncio.sleep(EMAIL_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1))
+
+async def run_email_worker(transport: EmailTransport = None, consumer: str = CONSUMER_NAME):
+    client = get_redis()
+    transport = transport or get_transport()
+    group_ready = False
+    failures = 0
+    while True:
+        try:
+            # Inside the loop so a worker started while Redis is down waits for it instead of exiting
+            if not group_ready:
+                await ensure_consumer_group(client)
+                group_ready = True
+                logger.info("Email worker %s started", consumer)
+
+            # Entries left unacknowledged by workers that died mid-batch
+            claimed = await client.xautoclaim(
+                OUTBOX_STREAM, OUTBOX_GROUP, consumer,
+                min_idle_time=EMAIL_CLAIM_IDLE_MS, start_id="0-0", count=EMAIL_BATCH_SIZE,
+            )
+            if claimed[1]:
+                await process_batch(client, transport, [e for e in claimed[1] if e[0] is not None])
+
+            response = await client.xreadgroup(
+                OUTBOX_GROUP, consumer, {OUTBOX_STREAM: ">"},
+                count=EMAIL_BATCH_SIZE, block=EMAIL_BLOCK_MS,
+            )
+            for _, entries in response or []:
+                await process_batch(client, transport, entries)
+            failures = 0
+        except RedisError as e:
+            failures += 1
+            # The stream (and with it the group) is gone, e.g. after a FLUSHALL
+            if "NOGROUP" in str(e):
+                group_ready = False
+            logger.error("Email worker error: %s", str(e))
+            await asyncio.sleep(min(WORKER_MAX_BACKOFF_SECONDS, 2 ** (failures - 1)))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_email_worker())
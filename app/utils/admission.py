@@ -0,0 +1,65 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import HTTPException
+
+from app.utils.metrics import ADMISSION_REJECTIONS, ADMISSION_WAIT
+
+class AdmissionController:
+    # Lets `max_concurrency` callers run at once and up to `max_queue` wait, each for at most `max_wait`
+    # seconds. Anything beyond that is turned away at once with 503 + Retry-After, so overload shows up
+    # as fast rejections instead of every request (including cheap ones) slowing down.
+    def __init__(self, name: str, max_concurrency: int, max_queue: int, max_wait: float):
+        self.name = name
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.running = 0
+        self.waiting = 0
+        # Moving average of how long one admitted call holds its slot
+        self.service_seconds = 0.0
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+
+    def stats(self) -> dict:
+        return {"workers": self.max_concurrency, "running": self.running, "queued": self.waiting}
+
+    def retry_after(self) -> int:
+        # Time for the current queue to drain
+        return max(1, math.ceil((self.waiting + 1) * self.service_seconds / self.max_concurrency))
+
+    def _reject(self, reason: str):
+        ADMISSION_REJECTIONS.labels(self.name, reason).inc()
+        raise HTTPException(
+            status_code=503,
+            detail="Server is busy, please retry shortly.",
+            headers={"Retry-After": str(self.retry_after())},
+        )
+
+    @asynccontextmanager
+    async def admit(self, shed: bool = True):
+        # shed=False is for background work (bulk imports) that may wait as long as it takes
+        if shed and self.running + self.waiting >= self.max_concurrency + self.max_queue:
+            self._reject("queue_full")
+        self.waiting += 1
+        started = time.perf_counter()
+        try:
+            if shed:
+                await asyncio.wait_for(self._semaphore.acquire(), self.max_wait)
+            else:
+                await self._semaphore.acquire()
+        except asyncio.TimeoutError:
+            self._reject("timeout")
+        finally:
+            self.waiting -= 1
+        admitted = time.perf_counter()
+        ADMISSION_WAIT.labels(self.name).observe(admitted - started)
+
+        self.running += 1
+        try:
+            yield
+        finally:
+            self.running -= 1
+            self._semaphore.release()
+            self.service_seconds += 0.1 * ((time.perf_counter() - admitted) - self.service_seconds)
@@ -0,0 +1,94 @@
+import hashlib
+import math
+import mmap
+import os
+import struct
+from typing import Iterable, Optional
+
+from app.config.settings import BREACHED_PASSWORD_FILTER_PATH
+
+# Bloom filter over the SHA-1 digests of breached passwords (the format of the Pwned Passwords lists).
+# File layout: header (magic, k, m bits, n entries) followed by the m-bit array. It is memory-mapped
+# read-only, so every worker on a host shares the same page-cache copy and nothing is loaded up front.
+# SHA-1 output is already uniform, so the k bit positions come from double hashing its first 16 bytes.
+
+MAGIC = b"BPF1"
+HEADER = struct.Struct("<4sIQQ")
+
+def bloom_parameters(entries: int, fp_rate: float):
+    # Optimal (bits, hash count) for `entries` items at the target false-positive rate
+    bits = max(8, math.ceil(-entries * math.log(fp_rate) / math.log(2) ** 2))
+    bits += -bits % 8
+    hashes = max(1, round(bits / max(1, entries) * math.log(2)))
+    return bits, hashes
+
+def expected_fp_rate(bits: int, hashes: int, entries: int) -> float:
+    return (1 - math.exp(-hashes * entries / bits)) ** hashes
+
+def _positions(digest: bytes, bits: int, hashes: int):
+    h1 = int.from_bytes(digest[:8], "little")
+    h2 = int.from_bytes(digest[8:16], "little") | 1
+    return [(h1 + i * h2) % bits for i in range(hashes)]
+
+def password_digest(password: str) -> bytes:
+    return hashlib.sha1(password.encode()).digest()
+
+def build_filter(digests: Iterable[bytes], entries: int, fp_rate: float, path: str):
+    bits, hashes = bloom_parameters(entries, fp_rate)
+    array = bytearray(bits // 8)
+    added = 0
+    for digest in digests:
+        for position in _positions(digest, bits, hashes):
+            array[position >> 3] |= 1 << (position & 7)
+        added += 1
+    # Written next to the target and renamed over it: running workers keep their mapping of the old file
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, hashes, bits, added))
+        f.write(array)
+    os.replace(tmp_path, path)
+    return BreachedPasswordFilter(path)
+
+class BreachedPasswordFilter:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.hashes, self.bits, self.entries = HEADER.unpack_from(self._map)
+        if magic != MAGIC or len(self._map) != HEADER.size + self.bits // 8:
+            self._map.close()
+            raise ValueError(f"{path} is not a breached password filter")
+
+    @property
+    def size_bytes(self) -> int:
+        return len(self._map)
+
+    @property
+    def fp_rate(self) -> float:
+        return expected_fp_rate(self.bits, self.hashes, self.entries)
+
+    def contains_digest(self, digest: bytes) -> bool:
+        data = self._map
+        for position in _positions(digest, self.bits, self.hashes):
+            if not data[HEADER.size + (position >> 3)] & (1 << (position & 7)):
+                return False
+        return True
+
+    def contains(self, password: str) -> bool:
+        return self.contains_digest(password_digest(password))
+
+    def close(self):
+        self._map.close()
+
+_filter: BreachedPasswordFilter = None
+
+def get_breached_password_filter() -> Optional[BreachedPasswordFilter]:
+    # Opened once per process; a configured but missing or corrupt file fails startup
+    global _filter
+    if _filter is None and BREACHED_PASSWORD_FILTER_PATH:
+        _filter = BreachedPasswordFilter(BREACHED_PASSWORD_FILTER_PATH)
+    return _filter
+
+def is_breached_password(password: str) -> bool:
+    breached_filter = get_breached_password_filter()
+    return breached_filter is not None and breached_filter.contains(password)
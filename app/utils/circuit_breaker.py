@@ -0,0 +1,78 @@
+import asyncio
+import logging
+import time
+
+from app.utils.metrics import CIRCUIT_STATE
+
+logger = logging.getLogger(__name__)
+
+CLOSED, HALF_OPEN, OPEN = "closed", "half_open", "open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+class CircuitOpenError(Exception):
+    pass
+
+class CircuitBreaker:
+    # Stops calling a dependency after `failure_threshold` consecutive failures (errors or calls slower
+    # than `call_timeout` seconds). After `reset_timeout` seconds one probe call is let through; its
+    # success closes the circuit again.
+    def __init__(self, name: str, failure_threshold: int, reset_timeout: float, call_timeout: float = None,
+                 exceptions: tuple = (Exception,)):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.call_timeout = call_timeout
+        self.exceptions = exceptions
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_in_flight = False
+        self._set_state(CLOSED)
+
+    def _set_state(self, state: str):
+        self.state = state
+        CIRCUIT_STATE.labels(self.name).set(STATE_VALUES[state])
+
+    def allow(self) -> bool:
+        if self.state == CLOSED:
+            return True
+        if self.state == OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.probe_in_flight = False
+        if self.state != CLOSED:
+            logger.info("Circuit %s closed", self.name)
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        self.failures += 1
+        self.probe_in_flight = False
+        if self.state == HALF_OPEN or self.failures >= self.failure_threshold:
+            if self.state != OPEN:
+                logger.warning("Circuit %s opened after %d failures", self.name, self.failures)
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    async def call(self, fn, *args, **kwargs):
+        # Raises CircuitOpenError without calling fn while the circuit is open
+        if not self.allow():
+            raise CircuitOpenError(self.name)
+        try:
+            if self.call_timeout is None:
+                result = await fn(*args, **kwargs)
+            else:
+                result = await asyncio.wait_for(fn(*args, **kwargs), self.call_timeout)
+        except (asyncio.TimeoutError, *self.exceptions):
+            self.record_failure()
+            raise
+        except BaseException:
+            # Cancellation or an unrelated error says nothing about the dependency
+            self.probe_in_flight = False
+            raise
+        self.record_success()
+        return result
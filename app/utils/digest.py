@@ -0,0 +1,5 @@
+import hashlib
+
+def token_digest(token: str) -> bytes:
+    # Fixed-width (32 byte) fingerprint used wherever a token has to be stored or looked up
+    return hashlib.sha256(token.encode()).digest()
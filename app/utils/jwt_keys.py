@@ -0,0 +1,126 @@
+import hashlib
+import json
+import os
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import jwt
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, ed25519
+
+from app.config.settings import JWT_ACCESS_ALGORITHM, JWT_ACTIVE_KID, JWT_KEYS_DIR, JWT_SECRET_KEY
+
+# Access-token signing keys. With an asymmetric JWT_ACCESS_ALGORITHM, JWT_KEYS_DIR holds one PEM file per key:
+#   <kid>.pem      private key; JWT_ACTIVE_KID picks the one that signs, all of them are published
+#   <kid>.pub.pem  retired key; only published so tokens it signed keep verifying until they expire
+# Rotation: add the new key, wait for JWKS caches to pick it up, switch JWT_ACTIVE_KID, retire the old key
+# once its last token has expired, then delete it.
+
+ASYMMETRIC_ALGORITHMS = ("EdDSA", "ES256")
+PRIVATE_KEY_SUFFIX = ".pem"
+PUBLIC_KEY_SUFFIX = ".pub.pem"
+
+@dataclass
+class KeySet:
+    signing_algorithm: str
+    signing_kid: Optional[str]
+    signing_key: Any
+    # kid -> (algorithm, key); HS256 tokens carry no kid and are found under None
+    verification_keys: dict = field(default_factory=dict)
+    jwks: bytes = b'{"keys":[]}'
+    etag: str = ""
+
+    def verification_key(self, kid: Optional[str]):
+        return self.verification_keys.get(kid)
+
+def jwks_etag(jwks: bytes) -> str:
+    return '"' + hashlib.sha256(jwks).hexdigest()[:32] + '"'
+
+def is_asymmetric(algorithm: str = JWT_ACCESS_ALGORITHM) -> bool:
+    return algorithm in ASYMMETRIC_ALGORITHMS
+
+def generate_private_key(algorithm: str):
+    if algorithm == "EdDSA":
+        return ed25519.Ed25519PrivateKey.generate()
+    if algorithm == "ES256":
+        return ec.generate_private_key(ec.SECP256R1())
+    raise ValueError(f"Unsupported signing algorithm: {algorithm}")
+
+def key_algorithm(key) -> str:
+    if isinstance(key, (ed25519.Ed25519PrivateKey, ed25519.Ed25519PublicKey)):
+        return "EdDSA"
+    if isinstance(key, (ec.EllipticCurvePrivateKey, ec.EllipticCurvePublicKey)) and isinstance(key.curve, ec.SECP256R1):
+        return "ES256"
+    raise ValueError(f"Unsupported key type: {type(key).__name__}")
+
+def private_key_pem(key) -> bytes:
+    return key.private_bytes(serialization.Encoding.PEM, serialization.PrivateFormat.PKCS8, serialization.NoEncryption())
+
+def public_key_pem(key) -> bytes:
+    return key.public_bytes(serialization.Encoding.PEM, serialization.PublicFormat.SubjectPublicKeyInfo)
+
+def public_jwk(kid: str, public_key) -> dict:
+    algorithm = key_algorithm(public_key)
+    algorithm_impl = jwt.get_algorithm_by_name(algorithm)
+    jwk = algorithm_impl.to_jwk(public_key, as_dict=True)
+    jwk.update({"kid": kid, "alg": algorithm, "use": "sig"})
+    return jwk
+
+def read_keys(keys_dir: str = JWT_KEYS_DIR):
+    # Returns ({kid: private_key}, {kid: public_key}) where the public keys include those of the private keys
+    private_keys, public_keys = {}, {}
+    if not os.path.isdir(keys_dir):
+        return private_keys, public_keys
+    for name in sorted(os.listdir(keys_dir)):
+        path = os.path.join(keys_dir, name)
+        with open(path, "rb") as f:
+            data = f.read()
+        if name.endswith(PUBLIC_KEY_SUFFIX):
+            public_keys[name[:-len(PUBLIC_KEY_SUFFIX)]] = serialization.load_pem_public_key(data)
+        elif name.endswith(PRIVATE_KEY_SUFFIX):
+            kid = name[:-len(PRIVATE_KEY_SUFFIX)]
+            private_keys[kid] = serialization.load_pem_private_key(data, password=None)
+            public_keys[kid] = private_keys[kid].public_key()
+    return private_keys, public_keys
+
+def load_key_set(algorithm: str = JWT_ACCESS_ALGORITHM, keys_dir: str = JWT_KEYS_DIR, active_kid: str = JWT_ACTIVE_KID) -> KeySet:
+    if not is_asymmetric(algorithm):
+        # Shared-secret signing: nothing can be published, the document is served with an empty key list
+        jwks = KeySet.jwks
+        return KeySet(algorithm, None, JWT_SECRET_KEY, {None: (algorithm, JWT_SECRET_KEY)}, jwks, jwks_etag(jwks))
+
+    private_keys, public_keys = read_keys(keys_dir)
+    if active_kid is None:
+        if len(private_keys) != 1:
+            raise RuntimeError(f"Expected one private key in {keys_dir} or JWT_ACTIVE_KID, found {sorted(private_keys)}")
+        active_kid = next(iter(private_keys))
+    if active_kid not in private_keys:
+        raise RuntimeError(f"No private key for JWT_ACTIVE_KID={active_kid} in {keys_dir}")
+    if key_algorithm(private_keys[active_kid]) != algorithm:
+        raise RuntimeError(f"Key {active_kid} is not an {algorithm} key")
+
+    jwks = json.dumps(
+        {"keys": [public_jwk(kid, key) for kid, key in public_keys.items()]}, separators=(",", ":")
+    ).encode()
+    return KeySet(
+        signing_algorithm=algorithm,
+        signing_kid=active_kid,
+        signing_key=private_keys[active_kid],
+        verification_keys={kid: (key_algorithm(key), key) for kid, key in public_keys.items()},
+        jwks=jwks,
+        etag=jwks_etag(jwks),
+    )
+
+_key_set: KeySet = None
+
+def get_key_set() -> KeySet:
+    # Loaded once per process; rotating keys takes a restart (or reload_key_set)
+    global _key_set
+    if _key_set is None:
+        _key_set = load_key_set()
+    return _key_set
+
+def reload_key_set() -> KeySet:
+    global _key_set
+    _key_set = None
+    return get_key_set()
@@ -1,18 +1,53 @@
 
 import jwt
 from jwt.exceptions import InvalidTokenError
-from fastapi import HTTPException, Request
+from fastapi import Depends, HTTPException, Request
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
-from app.config.settings import ALGORITHM, JWT_SECRET_KEY
+from app.config.settings import ALGORITHM, JWT_REFRESH_SECRET_KEY, VERIFIED_TOKEN_CACHE_SIZE
+from app.utils.cache import TTLCache
+from app.utils.digest import token_digest
+from app.utils.jwt_keys import get_key_set
+from app.utils.metrics import observe_phase
+from app.utils.revocation import is_token_revoked
+from app.utils.token_generation import get_token_generation
+
+# Recently verified tokens, keyed by digest; repeat requests skip the HMAC check and JSON parsing
+_verified_claims = TTLCache(maxsize=VERIFIED_TOKEN_CACHE_SIZE)
+
+def decode_access_token(jwtoken: str) -> dict:
+    # The key, and with it the only accepted algorithm, comes from the token's kid
+    key = get_key_set().verification_key(jwt.get_unverified_header(jwtoken).get("kid"))
+    if key is None:
+        raise InvalidTokenError("Unknown signing key")
+    algorithm, key = key
+    return jwt.decode(jwtoken, key, [algorithm])
 
 def decodeJWT(jwtoken: str):
     try:
         # Decode and verify the token
-        payload = jwt.decode(jwtoken, JWT_SECRET_KEY, ALGORITHM)
+        payload = decode_access_token(jwtoken)
         return payload
     except InvalidTokenError:
         return None
 
+def decode_refresh_token(jwtoken: str):
+    # Refresh tokens are only ever checked here, so they are not cached
+    try:
+        with observe_phase("jwt_decode"):
+            return jwt.decode(jwtoken, JWT_REFRESH_SECRET_KEY, ALGORITHM)
+    except InvalidTokenError:
+        return None
+
+def get_verified_claims(jwtoken: str):
+    key = token_digest(jwtoken)
+    payload = _verified_claims.get(key)
+    if payload is None:
+        with observe_phase("jwt_decode"):
+            payload = decodeJWT(jwtoken)
+        if payload:
+            _verified_claims.set(key, payload, payload["exp"])
+    return payload
+
 class JWTBearer(HTTPBearer):
     def __init__(self, auto_error: bool = True):
         super(JWTBearer, self).__init__(auto_error=auto_error)
@@ -22,21 +57,21 @@ class JWTBearer(HTTPBearer):
         if credentials:
             if not credentials.scheme == "Bearer":
                 raise HTTPException(status_code=403, detail="Invalid authentication scheme.")
-            if not self.verify_jwt(credentials.credentials):
+            payload = get_verified_claims(credentials.credentials)
+            if not payload:
                 raise HTTPException(status_code=403, detail="Invalid token or expired token.")
+            if await is_token_revoked(credentials.credentials, payload["exp"]):
+                raise HTTPException(status_code=403, detail="Token has been revoked.")
+            # Tokens issued before the user's last "log out everywhere" (or password reset)
+            if payload.get("gen", 0) < await get_token_generation(int(payload["sub"])):
+                raise HTTPException(status_code=403, detail="Token has been revoked.")
+            # Hand the verified claims to downstream dependencies instead of decoding again
+            request.state.token_claims = payload
             return credentials.credentials
         else:
             raise HTTPException(status_code=403, detail="Invalid authorization code.")
 
-    def verify_jwt(self, jwtoken: str) -> bool:
-        isTokenValid: bool = False
-
-        try:
-            payload = decodeJWT(jwtoken)
-        except:
-            payload = None
-        if payload:
-            isTokenValid = True
-        return isTokenValid
+jwt_bearer = JWTBearer()
 
-jwt_bearer = JWTBearer()
\ No newline at end of file
+def get_token_claims(request: Request, token: str = Depends(jwt_bearer)) -> dict:
+    return request.state.token_claims
@@ -0,0 +1,143 @@
+import logging
+import math
+import time
+
+from fastapi import HTTPException
+from redis.exceptions import RedisError
+
+from app.config.settings import (LOGIN_EMAIL_FAILURE_THRESHOLD, LOGIN_FAILURE_WINDOW_SECONDS,
+                                 LOGIN_IP_FAILURE_THRESHOLD, LOGIN_LOCKOUT_BASE_SECONDS,
+                                 LOGIN_LOCKOUT_MAX_SECONDS, LOGIN_THROTTLE_CACHE_SIZE,
+                                 RATE_LIMIT_BREAKER_FAILURES, RATE_LIMIT_BREAKER_RESET_SECONDS,
+                                 RATE_LIMIT_REDIS_TIMEOUT_MS)
+from app.utils.cache import TTLCache
+from app.utils.circuit_breaker import CircuitBreaker
+from app.utils.metrics import observe_phase
+from app.utils.rate_limit import REDIS_UNAVAILABLE, load_script
+from app.utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Each key is a hash with the failure count and the lockout end (epoch ms). One call records a failure
+# for the email and the IP and returns how long each is locked (ms, 0 when not locked).
+FAILURE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local base = tonumber(ARGV[3])
+local max_lock = tonumber(ARGV[4])
+local result = {}
+for i, key in ipairs(KEYS) do
+    local threshold = tonumber(ARGV[4 + i])
+    local count = redis.call('HINCRBY', key, 'count', 1)
+    local locked_until = tonumber(redis.call('HGET', key, 'locked_until')) or 0
+    if count >= threshold then
+        locked_until = now + math.floor(math.min(max_lock, base * 2 ^ (count - threshold)))
+        redis.call('HSET', key, 'locked_until', locked_until)
+    end
+    redis.call('PEXPIRE', key, math.max(window, locked_until - now))
+    result[i] = math.max(0, locked_until - now)
+end
+return result
+"""
+
+# Returns the remaining lockout (ms) of each key, then the email's failure count
+CHECK_SCRIPT = """
+local now = tonumber(ARGV[1])
+local result = {}
+for i, key in ipairs(KEYS) do
+    local locked_until = tonumber(redis.call('HGET', key, 'locked_until')) or 0
+    result[i] = math.max(0, locked_until - now)
+end
+result[#KEYS + 1] = tonumber(redis.call('HGET', KEYS[1], 'count')) or 0
+return result
+"""
+
+class LoginThrottle:
+    # Checked before the user lookup and password verify, so a locked-out email or IP costs one
+    # Redis call (or nothing, once this worker has seen the lock) instead of a bcrypt run
+    def __init__(self, redis=None):
+        self.redis = redis
+        self.breaker = CircuitBreaker(
+            "redis_login_throttle",
+            failure_threshold=RATE_LIMIT_BREAKER_FAILURES,
+            reset_timeout=RATE_LIMIT_BREAKER_RESET_SECONDS,
+            call_timeout=RATE_LIMIT_REDIS_TIMEOUT_MS / 1000,
+            exceptions=(RedisError, OSError),
+        )
+        # key -> lockout end (epoch seconds), dropped when the lockout ends
+        self._locks = TTLCache(maxsize=LOGIN_THROTTLE_CACHE_SIZE)
+
+    def get_keys(self, email: str, ip: str):
+        return [f"login_fail:email:{email.strip().lower()}", f"login_fail:ip:{ip}"]
+
+    def _remember(self, keys, locked_ms, now: float) -> float:
+        # Returns the longest remaining lockout in seconds
+        longest = 0.0
+        for key, ms in zip(keys, locked_ms):
+            seconds = int(ms) / 1000
+            if seconds > 0:
+                self._locks.set(key, now + seconds, now + seconds)
+                longest = max(longest, seconds)
+        return longest
+
+    async def _call(self, source: str, keys, args):
+        client = self.redis or get_redis()
+        with observe_phase("redis_login_throttle"):
+            return await load_script(source, client)(keys=keys, args=args, client=client)
+
+    async def check(self, email: str, ip: str) -> int:
+        # Raises 429 while the email or the IP is locked out, otherwise returns the email's recent
+        # failures; fails open when Redis is unavailable
+        keys = self.get_keys(email, ip)
+        now = time.time()
+        failures = 0
+        locked_until = max(self._locks.get(key, 0) for key in keys)
+        if locked_until <= now:
+            try:
+                result = await self.breaker.call(self._call, CHECK_SCRIPT, keys, [int(now * 1000)])
+            except REDIS_UNAVAILABLE as e:
+                logger.warning("Login throttle check failed, allowing attempt: %s", str(e))
+                return 0
+            failures = int(result[-1])
+            locked_until = now + self._remember(keys, result[:-1], now)
+        if locked_until > now:
+            raise HTTPException(
+                status_code=429,
+                detail="Too many failed login attempts! Please wait before trying again.",
+                headers={"Retry-After": str(math.ceil(locked_until - now))},
+            )
+        return failures
+
+    async def record_failure(self, email: str, ip: str):
+        keys = self.get_keys(email, ip)
+        now = time.time()
+        args = [
+            int(now * 1000),
+            LOGIN_FAILURE_WINDOW_SECONDS * 1000,
+            LOGIN_LOCKOUT_BASE_SECONDS * 1000,
+            LOGIN_LOCKOUT_MAX_SECONDS * 1000,
+            LOGIN_EMAIL_FAILURE_THRESHOLD,
+            LOGIN_IP_FAILURE_THRESHOLD,
+        ]
+        try:
+            locked_ms = await self.breaker.call(self._call, FAILURE_SCRIPT, keys, args)
+        except REDIS_UNAVAILABLE as e:
+            logger.warning("Could not record failed login: %s", str(e))
+            return
+        self._remember(keys, locked_ms, now)
+
+    async def record_success(self, email: str):
+        # Only the email's counter: one valid account must not clear an attacker's IP
+        key = self.get_keys(email, "")[0]
+        self._locks.pop(key)
+        try:
+            await self.breaker.call(self._delete, key)
+        except REDIS_UNAVAILABLE as e:
+            logger.warning("Could not reset failed logins: %s", str(e))
+
+    async def _delete(self, key: str):
+        client = self.redis or get_redis()
+        with observe_phase("redis_login_throttle"):
+            await client.delete(key)
+
+login_throttle = LoginThrottle()
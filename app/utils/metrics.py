@@ -0,0 +1,90 @@
+import time
+from contextlib import contextmanager
+
+from prometheus_client import Counter, Gauge, Histogram
+
+# Latency buckets from sub-millisecond cache hits up to multi-second bcrypt queues
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+REQUEST_LATENCY = Histogram(
+    "http_request_duration_seconds",
+    "Time spent handling a request, by route template",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS,
+)
+
+PHASE_LATENCY = Histogram(
+    "auth_phase_duration_seconds",
+    "Time spent in one phase of request handling (hashing, JWT, DB, Redis)",
+    ["phase"],
+    buckets=LATENCY_BUCKETS,
+)
+
+PHASE_ERRORS = Counter(
+    "auth_phase_errors_total",
+    "Phases that ended with an exception",
+    ["phase"],
+)
+
+DB_POOL = Gauge("db_pool_connections", "Database pool connections by state", ["state"])
+REDIS_POOL = Gauge("redis_pool_connections", "Redis pool connections by state", ["state"])
+HASH_POOL = Gauge("password_hash_pool_tasks", "Password hashing tasks in the worker pool by state", ["state"])
+CIRCUIT_STATE = Gauge("circuit_breaker_state", "Circuit breaker state (0 closed, 1 half open, 2 open)", ["name"])
+RATE_LIMIT_CHECKS = Counter(
+    "rate_limit_checks_total",
+    "Rate limit checks by the tier that answered them (lease, blocked, redis, fallback) and outcome",
+    ["scope", "tier", "outcome"],
+)
+ADMISSION_WAIT = Histogram(
+    "admission_queue_wait_seconds",
+    "Time admitted work waited for a slot",
+    ["controller"],
+    buckets=LATENCY_BUCKETS,
+)
+ADMISSION_REJECTIONS = Counter(
+    "admission_rejections_total",
+    "Requests turned away with 503 because the queue was full or the wait too long",
+    ["controller", "reason"],
+)
+STARTUP_SECONDS = Gauge("app_startup_seconds", "Time this worker took to start, by phase (import, lifespan)", ["phase"])
+
+@contextmanager
+def observe_phase(phase: str):
+    started = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        PHASE_ERRORS.labels(phase).inc()
+        raise
+    finally:
+        PHASE_LATENCY.labels(phase).observe(time.perf_counter() - started)
+
+class MetricsMiddleware:
+    # Plain ASGI middleware: records per-route latency without buffering the response
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the scope; unmatched paths share one label
+            route = scope.get("route")
+            REQUEST_LATENCY.labels(
+                scope["method"],
+                getattr(route, "path", "unmatched"),
+                str(status_code),
+            ).observe(time.perf_counter() - started)
@@ -0,0 +1,77 @@
+import math
+import statistics
+import time
+
+from passlib.context import CryptContext
+
+SCHEMES = ("bcrypt", "argon2")
+# Calibration never goes below these, however slow the hardware
+MIN_BCRYPT_ROUNDS = 10
+MIN_ARGON2_TIME_COST = 1
+
+def build_password_context(
+    scheme: str = "bcrypt",
+    bcrypt_rounds: int = 12,
+    argon2_time_cost: int = 3,
+    argon2_memory_cost: int = 65536,
+    argon2_parallelism: int = 1,
+    upgrade_only: bool = False,
+) -> CryptContext:
+    # New hashes use `scheme` with the given cost; hashes made with the other scheme or a different
+    # cost are reported by needs_update and upgraded on the next successful login.
+    # With upgrade_only, hashes that are more expensive than configured are left alone.
+    if scheme not in SCHEMES:
+        raise ValueError(f"Unknown password hash scheme: {scheme}")
+    settings = {
+        "bcrypt__rounds": bcrypt_rounds,
+        "bcrypt__min_rounds": bcrypt_rounds,
+        "argon2__rounds": argon2_time_cost,
+        "argon2__min_rounds": argon2_time_cost,
+        "argon2__memory_cost": argon2_memory_cost,
+        "argon2__parallelism": argon2_parallelism,
+    }
+    if not upgrade_only:
+        settings["bcrypt__max_rounds"] = bcrypt_rounds
+        settings["argon2__max_rounds"] = argon2_time_cost
+    return CryptContext(
+        schemes=[scheme] + [other for other in SCHEMES if other != scheme],
+        default=scheme,
+        deprecated="auto",
+        **settings,
+    )
+
+def measure_hash_ms(context: CryptContext, samples: int = 3, password: str = "Calibrati0n-Passw0rd!") -> float:
+    # Hashing and verifying cost the same, so the median hash time is the verify time
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        context.hash(password)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+def calibrate_bcrypt_rounds(target_ms: float, samples: int = 3) -> int:
+    # Each extra round doubles the cost, so time one cheap setting and extrapolate
+    base_rounds = 8
+    base_ms = measure_hash_ms(build_password_context("bcrypt", bcrypt_rounds=base_rounds), samples)
+    rounds = base_rounds + math.floor(math.log2(max(target_ms, base_ms) / base_ms))
+    return min(31, max(MIN_BCRYPT_ROUNDS, rounds))
+
+def calibrate_argon2_time_cost(target_ms: float, memory_cost: int, parallelism: int, samples: int = 3) -> int:
+    # Argon2 cost grows linearly with time_cost for a fixed memory size
+    one_pass_ms = measure_hash_ms(
+        build_password_context("argon2", argon2_time_cost=1, argon2_memory_cost=memory_cost,
+                               argon2_parallelism=parallelism),
+        samples,
+    )
+    return max(MIN_ARGON2_TIME_COST, math.floor(target_ms / one_pass_ms))
+
+def calibrate(config: dict, target_ms: float, samples: int = 3) -> dict:
+    # Returns a copy of the hashing config with the cost of its scheme tuned to target_ms
+    config = dict(config)
+    if config["scheme"] == "argon2":
+        config["argon2_time_cost"] = calibrate_argon2_time_cost(
+            target_ms, config["argon2_memory_cost"], config["argon2_parallelism"], samples
+        )
+    else:
+        config["bcrypt_rounds"] = calibrate_bcrypt_rounds(target_ms, samples)
+    return config
@@ -1,66 +1,225 @@
-import os 
-from datetime import datetime, timedelta
+import asyncio
+import math
+import time
+from dataclasses import dataclass
 from fastapi import HTTPException, Request
-import redis
-
-# Define rate limiting settings
-RATE_LIMIT = 1  # Number of requests
-RATE_LIMIT_TIME = 3600  # Time window in seconds
-
-redis_host = os.environ.get("REDIS_HOST")
-redis_port = os.environ.get("REDIS_PORT")
-redis_password = os.environ.get("REDIS_PASSWORD")
-
-# Create a Redis client instance
-redis_client = redis.Redis(
-    host=redis_host,
-    port=redis_port,
-    password=redis_password,
-    ssl=True,  # Enable SSL/TLS
-    decode_responses=True,
+from redis.exceptions import RedisError
+
+from app.config.settings import (FORGOT_PASSWORD_RATE_LIMIT, FORGOT_PASSWORD_RATE_LIMIT_TIME,
+                                 RATE_LIMIT_BREAKER_FAILURES, RATE_LIMIT_BREAKER_RESET_SECONDS,
+                                 RATE_LIMIT_LEASE_SECONDS, RATE_LIMIT_LEASE_SIZE, RATE_LIMIT_LOCAL_CACHE_SIZE,
+                                 RATE_LIMIT_REDIS_TIMEOUT_MS, REGISTER_RATE_LIMIT, REGISTER_RATE_LIMIT_TIME)
+from app.utils.cache import TTLCache
+from app.utils.circuit_breaker import CircuitBreaker, CircuitOpenError
+from app.utils.metrics import RATE_LIMIT_CHECKS, observe_phase
+from app.utils.redis_client import get_redis
+
+# GCRA: each key holds the theoretical arrival time (TAT, in ms) of the next request.
+# A check and its update happen in one atomic script call, so concurrent requests cannot race.
+# A call asks for at least `need` and up to `want` requests, so a worker can lease a few at once,
+# and first hands back what its previous lease left unused.
+LEASE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local burst = tonumber(ARGV[3])
+local need = tonumber(ARGV[4])
+local want = tonumber(ARGV[5])
+local returned = tonumber(ARGV[6])
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat or tat < now then
+    tat = now
+end
+tat = math.max(now, tat - interval * returned)
+local available = math.floor((now + burst - tat) / interval + 1e-9)
+if available < need then
+    if returned > 0 then
+        redis.call('SET', KEYS[1], tat, 'PX', math.max(1, math.ceil(tat - now)))
+    end
+    return {0, math.ceil(tat + interval * need - burst - now)}
+end
+local granted = math.min(want, available)
+local new_tat = tat + interval * granted
+redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+return {granted, 0}
+"""
+
+# Gives back requests that should not count (e.g. a registration that failed validation)
+REFUND_SCRIPT = """
+local now = tonumber(ARGV[1])
+local interval = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local tat = tonumber(redis.call('GET', KEYS[1]))
+if not tat then
+    return 0
+end
+local new_tat = tat - interval * cost
+if new_tat <= now then
+    redis.call('DEL', KEYS[1])
+else
+    redis.call('SET', KEYS[1], new_tat, 'PX', math.ceil(new_tat - now))
+end
+return 1
+"""
+
+_scripts = {}
+
+def load_script(source: str, client):
+    if source not in _scripts:
+        _scripts[source] = client.register_script(source)
+    return _scripts[source]
+
+def client_ip(request: Request) -> str:
+    return request.client.host
+
+# Shared by every limiter: once Redis is failing or slow they all fall back to per-worker limits
+redis_breaker = CircuitBreaker(
+    "redis_rate_limit",
+    failure_threshold=RATE_LIMIT_BREAKER_FAILURES,
+    reset_timeout=RATE_LIMIT_BREAKER_RESET_SECONDS,
+    call_timeout=RATE_LIMIT_REDIS_TIMEOUT_MS / 1000,
+    exceptions=(RedisError, OSError),
 )
+REDIS_UNAVAILABLE = (CircuitOpenError, asyncio.TimeoutError, RedisError, OSError)
+
+@dataclass
+class Lease:
+    # Requests this worker took from Redis for one key and may still hand out
+    tokens: int = 0
+    expires_at: float = 0.0
+    # Redis said no: answer locally until then
+    blocked_until: float = 0.0
 
-def rate_limiter(request: Request):
-    client_ip = request.client.host
-    current_time = datetime.now()
+class RateLimiter:
+    # Route dependency allowing `limit` requests per `period` seconds for each key (client IP by default).
+    # Checks are answered from a per-worker lease when possible, from Redis otherwise, and from a
+    # per-worker GCRA while Redis is unavailable (each worker then allows up to `limit` on its own).
+    def __init__(
+        self,
+        scope: str,
+        limit: int,
+        period: int,
+        detail: str = "Rate limit exceeded! Please wait before trying again.",
+        key_func=client_ip,
+        redis=None,
+        breaker: CircuitBreaker = None,
+    ):
+        self.scope = scope
+        self.limit = limit
+        self.period = period
+        self.detail = detail
+        self.key_func = key_func
+        self.redis = redis
+        self.breaker = breaker or redis_breaker
+        self.interval_ms = period * 1000 / limit
+        # Small limits lease one request at a time, i.e. every check goes to Redis
+        self.lease_size = max(1, min(RATE_LIMIT_LEASE_SIZE, limit // 10))
+        self._leases = TTLCache(maxsize=RATE_LIMIT_LOCAL_CACHE_SIZE)
+        self._fallback = TTLCache(maxsize=RATE_LIMIT_LOCAL_CACHE_SIZE)
 
-    redis_key = "rate_limit:" + client_ip
+    def get_key(self, request: Request) -> str:
+        return f"rate_limit:{self.scope}:{self.key_func(request)}"
 
-    last_request_time, count, status = redis_client.hmget(redis_key, "timestamp", "count", "status")
+    def _record(self, tier: str, allowed: bool):
+        RATE_LIMIT_CHECKS.labels(self.scope, tier, "allowed" if allowed else "limited").inc()
+
+    async def _lease(self, key: str, need: int, want: int, returned: int):
+        client = self.redis or get_redis()
+        now_ms = int(time.time() * 1000)
+        with observe_phase("redis_rate_limit"):
+            return await load_script(LEASE_SCRIPT, client)(
+                keys=[key],
+                args=[now_ms, self.interval_ms, self.interval_ms * self.limit, need, want, returned],
+                client=client,
+            )
 
-    if status == b"failed":
-        count = 0  # Reset the count if the last request failed
-        return  # Skip counting failed requests
+    async def hit(self, key: str, cost: int = 1):
+        # Returns (allowed, retry_after_seconds)
+        now = time.time()
+        lease = self._leases.get(key)
+        if lease is None:
+            lease = Lease()
+            self._leases.set(key, lease, now + self.period)
+        if lease.blocked_until > now:
+            self._record("blocked", False)
+            return False, math.ceil(lease.blocked_until - now)
+        if lease.expires_at > now and lease.tokens >= cost:
+            lease.tokens -= cost
+            self._record("lease", True)
+            return True, 0
 
-    elif last_request_time and (current_time - datetime.strptime(last_request_time, "%Y-%m-%d %H:%M:%S.%f")) <= timedelta(seconds=RATE_LIMIT_TIME):
-        if int(count) >= RATE_LIMIT:
-            raise HTTPException(
-                status_code=429,
-                detail="Account creation rate limit exceeded! Please wait before trying again.",
+        # Sync with Redis: hand back what the old lease did not use and take a new one
+        returned, lease.tokens = lease.tokens, 0
+        try:
+            granted, retry_after_ms = await self.breaker.call(
+                self._lease, key, cost, max(cost, self.lease_size), returned
             )
-    else:
-        # Create a new Redis key for each new client and store request info
-        redis_client.hmset(
-            redis_key,
-            {
-                "timestamp": current_time.strftime("%Y-%m-%d %H:%M:%S.%f"),
-                "count": 0,
-                "status": b"failed",  # Set a default value here
-            },
-        )
-
-def update_request_info(redis_client, redis_key, status):
-    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S.%f")
-    if status == "failed":
-        count = 0
-    else:
-        count = int(redis_client.hget(redis_key, "count") or 0) + 1
-        
-    redis_client.hmset(
-        redis_key,
-        {
-            "timestamp": timestamp,
-            "count": count,
-            "status": status,
-        },
-    )
+        except REDIS_UNAVAILABLE:
+            lease.tokens += returned
+            return self._fallback_hit(key, cost, now)
+
+        granted = int(granted)
+        if not granted:
+            lease.blocked_until = now + int(retry_after_ms) / 1000
+            self._record("redis", False)
+            return False, math.ceil(int(retry_after_ms) / 1000)
+        lease.tokens += granted - cost
+        lease.expires_at = now + RATE_LIMIT_LEASE_SECONDS
+        self._record("redis", True)
+        return True, 0
+
+    def _fallback_hit(self, key: str, cost: int, now: float):
+        # The same GCRA as LEASE_SCRIPT, in seconds, for this worker only
+        interval = self.interval_ms / 1000
+        tat = max(self._fallback.get(key, now), now)
+        new_tat = tat + interval * cost
+        retry_after = new_tat - interval * self.limit - now
+        if retry_after > 1e-9:
+            self._record("fallback", False)
+            return False, math.ceil(retry_after)
+        self._fallback.set(key, new_tat, new_tat)
+        self._record("fallback", True)
+        return True, 0
+
+    async def refund(self, key: str, cost: int = 1):
+        # Refunds go straight to Redis so a retry on another worker sees them
+        try:
+            await self.breaker.call(self._refund, key, cost)
+        except REDIS_UNAVAILABLE:
+            tat = self._fallback.get(key)
+            if tat is not None:
+                self._fallback.set(key, tat - self.interval_ms / 1000 * cost, tat)
+
+    async def _refund(self, key: str, cost: int):
+        client = self.redis or get_redis()
+        now_ms = int(time.time() * 1000)
+        with observe_phase("redis_rate_limit_refund"):
+            await load_script(REFUND_SCRIPT, client)(keys=[key], args=[now_ms, self.interval_ms, cost], client=client)
+
+    async def __call__(self, request: Request):
+        key = self.get_key(request)
+        allowed, retry_after = await self.hit(key)
+        if not allowed:
+            raise HTTPException(status_code=429, detail=self.detail, headers={"Retry-After": str(retry_after)})
+        # Remember what was consumed so the handler can refund it
+        if not hasattr(request.state, "rate_limit_hits"):
+            request.state.rate_limit_hits = []
+        request.state.rate_limit_hits.append((self, key))
+
+async def refund_rate_limit(request: Request):
+    for limiter, key in getattr(request.state, "rate_limit_hits", []):
+        await limiter.refund(key)
+    request.state.rate_limit_hits = []
+
+rate_limiter = RateLimiter(
+    "register",
+    REGISTER_RATE_LIMIT,
+    REGISTER_RATE_LIMIT_TIME,
+    detail="Account creation rate limit exceeded! Please wait before trying again.",
+)
+
+forgot_password_rate_limiter = RateLimiter(
+    "forgot_password",
+    FORGOT_PASSWORD_RATE_LIMIT,
+    FORGOT_PASSWORD_RATE_LIMIT_TIME,
+    detail="Too many password reset requests! Please wait before trying again.",
+)
@@ -0,0 +1,35 @@
+import redis.asyncio as redis
+
+from app.config.settings import (REDIS_HOST, REDIS_MAX_CONNECTIONS, REDIS_PASSWORD,
+                                 REDIS_PORT, REDIS_SSL)
+
+# One client (and therefore one connection pool) per worker process
+_redis_client: redis.Redis = None
+
+def get_redis() -> redis.Redis:
+    global _redis_client
+    if _redis_client is None:
+        _redis_client = redis.Redis(
+            host=REDIS_HOST,
+            port=REDIS_PORT,
+            password=REDIS_PASSWORD,
+            ssl=REDIS_SSL,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            decode_responses=True,
+        )
+    return _redis_client
+
+def peek_redis():
+    # The current client without creating one
+    return _redis_client
+
+def set_redis(client: redis.Redis):
+    # Swap in another client, e.g. a local Redis or fakeredis for tests and benchmarks
+    global _redis_client
+    _redis_client = client
+
+async def close_redis():
+    global _redis_client
+    if _redis_client is not None:
+        await _redis_client.close()
+        _redis_client = None
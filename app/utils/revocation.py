@@ -0,0 +1,59 @@
+import logging
+import math
+import time
+
+from redis.exceptions import RedisError
+
+from app.config.settings import REVOCATION_CACHE_SIZE, REVOCATION_NEGATIVE_TTL_SECONDS
+from app.utils.cache import TTLCache
+from app.utils.digest import token_digest
+from app.utils.metrics import observe_phase
+from app.utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+REVOKED_KEY_PREFIX = "revoked:"
+
+# Per-process near-cache in front of Redis
+_near_cache = TTLCache(maxsize=REVOCATION_CACHE_SIZE)
+
+def _revoked_key(token: str) -> str:
+    return REVOKED_KEY_PREFIX + token_digest(token).hex()
+
+async def revoke_token(token: str, expires_at: float) -> bool:
+    return await revoke_token_digest(token_digest(token), expires_at)
+
+async def revoke_token_digest(digest: bytes, expires_at: float) -> bool:
+    # For tokens only known by their stored digest; the entry only needs to outlive the token itself.
+    # Returns False when Redis could not record it: only this worker then knows the token is revoked.
+    ttl = math.ceil(expires_at - time.time())
+    if ttl <= 0:
+        return True
+    key = REVOKED_KEY_PREFIX + digest.hex()
+    _near_cache.set(key, True, expires_at)
+    try:
+        with observe_phase("redis_revocation_write"):
+            await get_redis().set(key, 1, ex=ttl)
+    except RedisError as e:
+        logger.error("Could not record token revocation: %s", str(e))
+        return False
+    return True
+
+async def is_token_revoked(token: str, expires_at: float) -> bool:
+    key = _revoked_key(token)
+    revoked = _near_cache.get(key)
+    if revoked is not None:
+        return revoked
+
+    try:
+        with observe_phase("redis_revocation_check"):
+            revoked = bool(await get_redis().exists(key))
+    except RedisError as e:
+        logger.warning("Revocation lookup failed, accepting token: %s", str(e))
+        return False
+
+    if revoked:
+        _near_cache.set(key, True, expires_at)
+    elif REVOCATION_NEGATIVE_TTL_SECONDS > 0:
+        _near_cache.set(key, False, min(expires_at, time.time() + REVOCATION_NEGATIVE_TTL_SECONDS))
+    return revoked
@@ -0,0 +1,104 @@
+import logging
+
+from redis.exceptions import RedisError
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.settings import (TOKEN_GENERATION_CACHE_SIZE, TOKEN_GENERATION_LOCAL_TTL_SECONDS,
+                                 TOKEN_GENERATION_TTL_SECONDS)
+from app.db.database import SessionLocal
+from app.db.models import User
+from app.utils.cache import TTLCache
+from app.utils.metrics import observe_phase
+from app.utils.rate_limit import load_script
+from app.utils.redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+# Every token carries the user's generation ("gen" claim, 0 when missing) from when it was issued.
+# Bumping the generation revokes all of the user's tokens at once; users.token_generation is the
+# source of truth and Redis caches it for the per-request check.
+TOKEN_GENERATION_KEY_PREFIX = "token_gen:"
+# Stored for deleted users so their tokens fail without a database lookup
+DELETED_USER_GENERATION = 2 ** 31
+
+# Generations only go up: a reader that loaded an old value from the database cannot overwrite a bump
+SET_IF_GREATER_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]))
+local value = tonumber(ARGV[1])
+if current and current >= value then
+    return current
+end
+redis.call('SET', KEYS[1], value, 'EX', ARGV[2])
+return value
+"""
+
+# Short-lived per-worker copy for verifying tokens; its TTL bounds how long another worker's bump takes to
+# apply here. Issuing tokens skips it (fresh=True) so a new token never carries an already revoked generation.
+_local_cache = TTLCache(maxsize=TOKEN_GENERATION_CACHE_SIZE, ttl=TOKEN_GENERATION_LOCAL_TTL_SECONDS)
+
+def _key(user_id: int) -> str:
+    return TOKEN_GENERATION_KEY_PREFIX + str(user_id)
+
+async def _store(user_id: int, generation: int) -> int:
+    client = get_redis()
+    return int(await load_script(SET_IF_GREATER_SCRIPT, client)(
+        keys=[_key(user_id)], args=[generation, TOKEN_GENERATION_TTL_SECONDS], client=client
+    ))
+
+async def _load_from_db(db: AsyncSession, user_id: int) -> int:
+    generation = (await db.execute(select(User.token_generation).where(User.user_id == user_id))).scalar()
+    return DELETED_USER_GENERATION if generation is None else generation
+
+async def get_token_generation(user_id: int, db: AsyncSession = None, fresh: bool = False) -> int:
+    if not fresh:
+        generation = _local_cache.get(user_id)
+        if generation is not None:
+            return generation
+
+    try:
+        with observe_phase("redis_token_generation"):
+            cached = await get_redis().get(_key(user_id))
+        if cached is not None:
+            generation = int(cached)
+            _local_cache.set(user_id, generation)
+            return generation
+    except RedisError as e:
+        logger.warning("Token generation read failed, using the database: %s", str(e))
+
+    if db is None:
+        async with SessionLocal() as session:
+            generation = await _load_from_db(session, user_id)
+    else:
+        generation = await _load_from_db(db, user_id)
+    try:
+        generation = await _store(user_id, generation)
+    except RedisError as e:
+        logger.warning("Token generation write failed: %s", str(e))
+    _local_cache.set(user_id, generation)
+    return generation
+
+def bump_token_generation_statement(user_id: int):
+    # For callers that bump in the same transaction as another change (password reset)
+    return update(User).where(User.user_id == user_id).values(token_generation=User.token_generation + 1)
+
+async def publish_token_generation(db: AsyncSession, user_id: int):
+    # Call after the bump has committed. Raises RedisError when Redis still holds the old generation, i.e.
+    # other workers keep accepting the revoked tokens until TOKEN_GENERATION_TTL_SECONDS
+    generation = await _load_from_db(db, user_id)
+    _local_cache.pop(user_id)
+    try:
+        await _store(user_id, generation)
+    except RedisError as e:
+        logger.warning("Token generation publish failed, dropping the cached value: %s", str(e))
+        try:
+            # Without a cached value readers fall back to the database, which has the bump
+            await get_redis().delete(_key(user_id))
+        except RedisError:
+            logger.error("Token generation for user %s is stale in Redis", user_id)
+            raise
+
+async def bump_token_generation(db: AsyncSession, user_id: int):
+    await db.execute(bump_token_generation_statement(user_id))
+    await db.commit()
+    await publish_token_generation(db, user_id)
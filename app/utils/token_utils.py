@@ -1,22 +1,50 @@
-import os
-from dotenv import load_dotenv
+import asyncio
+import logging
+import uuid
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Any, Union
 
 import jwt
-from jose import jwt
 
 from fastapi import Depends
-from passlib.context import CryptContext
 from app.config.settings import (ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM,
-                        REFRESH_TOKEN_EXPIRE_MINUTES)
-from app.utils.jwt_utils import JWTBearer
+                        ARGON2_MEMORY_COST, ARGON2_PARALLELISM, ARGON2_TIME_COST,
+                        BCRYPT_ROUNDS, HASH_POOL_KIND, HASH_POOL_WORKERS, HASH_QUEUE_MAX_WAIT_SECONDS,
+                        HASH_QUEUE_SIZE, JWT_REFRESH_SECRET_KEY,
+                        PASSWORD_HASH_SCHEME, PASSWORD_HASH_TARGET_MS, REFRESH_TOKEN_EXPIRE_MINUTES)
+from app.utils.admission import AdmissionController
+from app.utils.jwt_keys import get_key_set
+from app.utils.jwt_utils import get_token_claims
+from app.utils.metrics import observe_phase
+from app.utils.password_hashing import build_password_context, calibrate
 
-load_dotenv()
-JWT_SECRET_KEY = os.environ.get("JWT_SECRET_KEY")
-JWT_REFRESH_SECRET_KEY = os.environ.get("JWT_REFRESH_SECRET_KEY")
+logger = logging.getLogger(__name__)
 
-password_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+password_hash_config = {
+    "scheme": PASSWORD_HASH_SCHEME,
+    "bcrypt_rounds": BCRYPT_ROUNDS,
+    "argon2_time_cost": ARGON2_TIME_COST,
+    "argon2_memory_cost": ARGON2_MEMORY_COST,
+    "argon2_parallelism": ARGON2_PARALLELISM,
+}
+password_context = build_password_context(**password_hash_config)
+
+def configure_password_hashing(config: dict):
+    # Also used as the process-pool initializer so child processes hash with the same settings
+    global password_hash_config, password_context
+    password_hash_config = dict(config)
+    password_context = build_password_context(**password_hash_config)
+
+def calibrate_password_hashing(target_ms: float = PASSWORD_HASH_TARGET_MS):
+    # Runs at startup before the hashing pool exists; calibrated costs only upgrade stored hashes
+    # Skipped when already calibrated, e.g. by app.cli.serve before forking the workers
+    if target_ms is None or password_hash_config.get("upgrade_only"):
+        return
+    config = calibrate(password_hash_config, target_ms)
+    config["upgrade_only"] = True
+    configure_password_hashing(config)
+    logger.info("Password hashing calibrated to %s ms: %s", target_ms, config)
 
 def get_hashed_password(password: str):
     return password_context.hash(password)
@@ -24,27 +52,77 @@ def get_hashed_password(password: str):
 def verify_password(password: str, hashed_pass: str) -> bool:
     return password_context.verify(password, hashed_pass)
 
-def create_access_token(subject: Union[str, Any], expires_delta: int = None) -> str:
+def verify_and_update_password(password: str, hashed_pass: str):
+    # Returns (is_valid, new_hash); new_hash is set when the stored hash uses an outdated scheme or cost
+    return password_context.verify_and_update(password, hashed_pass)
+
+# Bounded pool that runs bcrypt off the event loop, created lazily so forked workers get their own
+_hash_executor: Executor = None
+# One slot per pool worker, so admitted work starts right away and the rest waits (or is shed) here
+hash_admission = AdmissionController("password_hash", HASH_POOL_WORKERS, HASH_QUEUE_SIZE, HASH_QUEUE_MAX_WAIT_SECONDS)
+
+def get_hash_executor() -> Executor:
+    global _hash_executor
+    if _hash_executor is None:
+        if HASH_POOL_KIND == "process":
+            _hash_executor = ProcessPoolExecutor(
+                max_workers=HASH_POOL_WORKERS,
+                initializer=configure_password_hashing,
+                initargs=(password_hash_config,),
+            )
+        else:
+            _hash_executor = ThreadPoolExecutor(max_workers=HASH_POOL_WORKERS, thread_name_prefix="bcrypt")
+    return _hash_executor
+
+def shutdown_hash_executor():
+    global _hash_executor
+    if _hash_executor is not None:
+        _hash_executor.shutdown(wait=True)
+        _hash_executor = None
+
+def get_hash_pool_stats() -> dict:
+    return hash_admission.stats()
+
+async def _run_in_hash_pool(phase: str, fn, *args, shed: bool = True):
+    loop = asyncio.get_running_loop()
+    async with hash_admission.admit(shed=shed):
+        with observe_phase(phase):
+            return await loop.run_in_executor(get_hash_executor(), fn, *args)
+
+async def get_hashed_password_async(password: str, shed: bool = True) -> str:
+    return await _run_in_hash_pool("password_hash", get_hashed_password, password, shed=shed)
+
+async def verify_password_async(password: str, hashed_pass: str) -> bool:
+    return await _run_in_hash_pool("password_verify", verify_password, password, hashed_pass)
+
+async def verify_and_update_password_async(password: str, hashed_pass: str):
+    return await _run_in_hash_pool("password_verify", verify_and_update_password, password, hashed_pass)
+
+def create_access_token(subject: Union[str, Any], expires_delta: int = None, generation: int = 0) -> str:
     if expires_delta is not None:
         expires_delta = datetime.utcnow() + expires_delta
     else:
         expires_delta = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
     
-    to_encode = {"exp": expires_delta, "sub": str(subject)}
-    encoded_jwt = jwt.encode(to_encode, JWT_SECRET_KEY, ALGORITHM)
+    # jti keeps tokens issued to the same user within one second distinct; gen is the user's token generation
+    to_encode = {"exp": expires_delta, "sub": str(subject), "jti": uuid.uuid4().hex, "gen": generation}
+    keys = get_key_set()
+    headers = {"kid": keys.signing_kid} if keys.signing_kid else None
+    with observe_phase("jwt_encode"):
+        encoded_jwt = jwt.encode(to_encode, keys.signing_key, keys.signing_algorithm, headers=headers)
     return encoded_jwt
 
-def create_refresh_token(subject: Union[str, Any], expires_delta: int = None) -> str:
+def create_refresh_token(subject: Union[str, Any], expires_delta: int = None, generation: int = 0) -> str:
     if expires_delta is not None:
         expires_delta = datetime.utcnow() + expires_delta
     else:
         expires_delta = datetime.utcnow() + timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES)
     
-    to_encode = {"exp": expires_delta, "sub": str(subject)}
+    # jti keeps tokens issued to the same user within one second distinct; gen is the user's token generation
+    to_encode = {"exp": expires_delta, "sub": str(subject), "jti": uuid.uuid4().hex, "gen": generation}
     encoded_jwt = jwt.encode(to_encode, JWT_REFRESH_SECRET_KEY, ALGORITHM)
     return encoded_jwt
 
-def get_authenticated_user_id(token: str = Depends(JWTBearer())) -> int:
-    payload = jwt.decode(token, JWT_SECRET_KEY, ALGORITHM)
+def get_authenticated_user_id(payload: dict = Depends(get_token_claims)) -> int:
     authenticated_user_id = int(payload['sub'])
     return authenticated_user_id
\ No newline at end of file
@@ -0,0 +1,169 @@
+import asyncio
+import json
+import logging
+from dataclasses import asdict, dataclass
+from typing import Optional, Tuple
+
+from redis.exceptions import RedisError
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.settings import (USER_CACHE_LOCAL_TTL_SECONDS, USER_CACHE_SIZE, USER_CACHE_TOMBSTONE_SECONDS,
+                                 USER_CACHE_TTL_SECONDS)
+from app.db.models import User
+from app.utils.cache import TTLCache
+from app.utils.metrics import observe_phase
+from app.utils.rate_limit import load_script
+from app.utils.redis_client import get_redis
+from app.utils.validators import normalize_email
+
+logger = logging.getLogger(__name__)
+
+# v2: entries no longer carry the password hash (the v1 keys expire on their own)
+USER_ID_KEY_PREFIX = "user:v2:id:"
+USER_EMAIL_KEY_PREFIX = "user:v2:email:"
+TOMBSTONE_KEY_PREFIX = "user:v2:tombstone:"
+INVALIDATION_CHANNEL = "user-cache:invalidate"
+
+# KEYS: the cache keys, then their tombstones in the same order. Fills nothing if any key was invalidated
+# recently: the row was then read before a write committed and would put stale data back.
+FILL_SCRIPT = """
+local count = #KEYS / 2
+for i = 1, count do
+    if redis.call('EXISTS', KEYS[count + i]) == 1 then
+        return 0
+    end
+end
+for i = 1, count do
+    redis.call('SET', KEYS[i], ARGV[1], 'EX', ARGV[2])
+end
+return 1
+"""
+
+@dataclass
+class CachedUser:
+    # Read-only snapshot of a users row; writes go through UPDATE/DELETE statements plus invalidate_user.
+    # The password hash is left out on purpose: paths that verify a password load the row with
+    # get_user_with_password_by_email/by_id instead.
+    user_id: int
+    username: str
+    email: str
+    currency: str
+
+    @classmethod
+    def from_row(cls, user: User) -> "CachedUser":
+        return cls(user_id=user.user_id, username=user.username, email=user.email, currency=user.currency)
+
+# Tier 1: per-process LRU with a short TTL. Tier 2: Redis shared by all workers.
+_local_cache = TTLCache(maxsize=USER_CACHE_SIZE, ttl=USER_CACHE_LOCAL_TTL_SECONDS)
+
+def _id_key(user_id: int) -> str:
+    return USER_ID_KEY_PREFIX + str(user_id)
+
+def _email_key(email: str) -> str:
+    return USER_EMAIL_KEY_PREFIX + normalize_email(email)
+
+async def _read_through(key: str, query):
+    user = _local_cache.get(key)
+    if user is not None:
+        return user
+
+    try:
+        with observe_phase("redis_user_cache"):
+            cached = await get_redis().get(key)
+        if cached is not None:
+            user = CachedUser(**json.loads(cached))
+            _remember_locally(user)
+            return user
+    except RedisError as e:
+        logger.warning("User cache read failed: %s", str(e))
+
+    row = await query()
+    if row is None:
+        return None
+    user = CachedUser.from_row(row)
+    keys = [_id_key(user.user_id), _email_key(user.email)]
+    try:
+        # Stored under both keys so either lookup is a single GET
+        client = get_redis()
+        filled = await load_script(FILL_SCRIPT, client)(
+            keys=keys + [TOMBSTONE_KEY_PREFIX + key for key in keys],
+            args=[json.dumps(asdict(user)), USER_CACHE_TTL_SECONDS],
+            client=client,
+        )
+    except RedisError as e:
+        logger.warning("User cache write failed: %s", str(e))
+        filled = True
+    if filled:
+        _remember_locally(user)
+    return user
+
+def _remember_locally(user: CachedUser):
+    _local_cache.set(_id_key(user.user_id), user)
+    _local_cache.set(_email_key(user.email), user)
+
+async def get_user_by_id(db: AsyncSession, user_id: int) -> CachedUser:
+    async def query():
+        return (await db.execute(select(User).filter(User.user_id == user_id))).scalars().first()
+    return await _read_through(_id_key(user_id), query)
+
+async def get_user_by_email(db: AsyncSession, email: str) -> CachedUser:
+    email = normalize_email(email)
+
+    async def query():
+        # Matches the unique index on lower(email)
+        return (await db.execute(select(User).filter(func.lower(User.email) == email))).scalars().first()
+    return await _read_through(_email_key(email), query)
+
+# Never cached: a reset must stop the old password at once, and hashes stay out of Redis. Password checks
+# read the row (hash included) in one query rather than a cache lookup followed by a query for the hash.
+async def _load_with_password(db: AsyncSession, condition) -> Tuple[Optional[CachedUser], Optional[str]]:
+    row = (await db.execute(select(User).filter(condition))).scalars().first()
+    if row is None:
+        return None, None
+    return CachedUser.from_row(row), row.password
+
+async def get_user_with_password_by_email(db: AsyncSession, email: str) -> Tuple[Optional[CachedUser], Optional[str]]:
+    return await _load_with_password(db, func.lower(User.email) == normalize_email(email))
+
+async def get_user_with_password_by_id(db: AsyncSession, user_id: int) -> Tuple[Optional[CachedUser], Optional[str]]:
+    return await _load_with_password(db, User.user_id == user_id)
+
+def _forget_locally(user_id: int, emails):
+    _local_cache.pop(_id_key(user_id))
+    for email in emails:
+        _local_cache.pop(_email_key(email))
+
+async def invalidate_user(user_id: int, *emails: str):
+    # Call after the write has committed, with every email the user had before and after it
+    _forget_locally(user_id, emails)
+    keys = [_id_key(user_id), *(_email_key(email) for email in emails)]
+    try:
+        client = get_redis()
+        # Tombstones stop readers that loaded the row before this write from caching it again
+        async with client.pipeline(transaction=True) as pipe:
+            pipe.delete(*keys)
+            for key in keys:
+                pipe.set(TOMBSTONE_KEY_PREFIX + key, 1, ex=USER_CACHE_TOMBSTONE_SECONDS)
+            await pipe.execute()
+        await client.publish(INVALIDATION_CHANNEL, json.dumps({"user_id": user_id, "emails": list(emails)}))
+    except RedisError as e:
+        logger.warning("User cache invalidation failed: %s", str(e))
+
+async def run_invalidation_listener():
+    # Drops entries other workers invalidated; the local TTL bounds staleness if a message is missed
+    while True:
+        pubsub = get_redis().pubsub(ignore_subscribe_messages=True)
+        try:
+            await pubsub.subscribe(INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                if message is None or message.get("type") != "message":
+                    continue
+                data = json.loads(message["data"])
+                _forget_locally(data["user_id"], data["emails"])
+        except RedisError as e:
+            logger.warning("User cache invalidation listener error: %s", str(e))
+            _local_cache.clear()
+        finally:
+            await pubsub.reset()
+        await asyncio.sleep(1)
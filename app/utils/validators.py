@@ -1,6 +1,12 @@
 import re
 from fastapi import HTTPException
 
+from app.utils.breached_passwords import is_breached_password
+
+# Emails are stored and looked up in this form, so they compare case-insensitively
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
 #Email constraints /\S+@\S+\.\S+/;
 def validate_email(email: str):
     if not re.match(r"[^@]+@[^@]+\.[^@]+", email):
@@ -19,4 +25,7 @@ def validate_password(new_password):
         raise HTTPException(status_code=400, detail="Password must contain at least one digit")
     if not any(char in "!@#$%^&*()-_+=:." for char in new_password):
         raise HTTPException(status_code=400, detail="Password must contain at least one special character")
+    # Local filter lookup, no network call; a false positive only asks the user for another password
+    if is_breached_password(new_password):
+        raise HTTPException(status_code=400, detail="This password has appeared in a data breach, please choose another")
     return True
\ No newline at end of file
@@ -1,61 +1,119 @@
-from datetime import timedelta
-from fastapi import BackgroundTasks, Depends
-from sqlalchemy import func
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime
+from redis.exceptions import RedisError
 import logging
-import requests
 
-from apscheduler.schedulers.background import BackgroundScheduler
-from apscheduler.triggers.interval import IntervalTrigger
-
-from app.db.models import TokenTable
-from app.config.settings import ACCESS_TOKEN_EXPIRE_MINUTES, CLEANUP_INTERVAL_HOURS, SERVER_URL, CLEANUP_ROUTE
-from app.db.database import get_session
-
-scheduler = BackgroundScheduler()
+from app.config.settings import CLEANUP_BATCH_PAUSE_SECONDS, CLEANUP_BATCH_SIZE, CLEANUP_INTERVAL_HOURS
+from app.db.token_store import get_token_store
+from app.utils.redis_client import get_redis
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Dependency Injection
-def start_cleanup_scheduler(scheduler: BackgroundScheduler):
-    scheduler.add_job(send_cleanup_tokens_request, trigger=IntervalTrigger(hours=CLEANUP_INTERVAL_HOURS))
-    scheduler.start()
+JOB_LOCK_PREFIX = "lock:job:"
 
-def send_cleanup_tokens_request():
-    try:
-        cleanup_url = SERVER_URL + '/api'+ CLEANUP_ROUTE
-        response = requests.get(cleanup_url)
-        response.raise_for_status()  # Raise exception for non-2xx status codes
-        logger.info("Cleanup request successful: %s", response.json())
-    except requests.exceptions.RequestException as e:
-        logger.error("Cleanup request failed: %s", str(e))
+# The scheduler is created and started from the app lifespan, one per worker process;
+# a Redis lock makes sure each firing runs in only one of them across the cluster
+def create_cleanup_scheduler():
+    # Imported here so processes running without the scheduler never load APScheduler
+    from apscheduler.schedulers.asyncio import AsyncIOScheduler
+    from apscheduler.triggers.interval import IntervalTrigger
+
+    scheduler = AsyncIOScheduler()
+    scheduler.add_job(
+        run_scheduled_token_cleanup,
+        trigger=IntervalTrigger(hours=CLEANUP_INTERVAL_HOURS),
+        id="token_cleanup",
+        coalesce=True,
+        max_instances=1,
+    )
+    return scheduler
 
-# Start the scheduler with dependency injection
-start_cleanup_scheduler(scheduler)
+async def acquire_job_lock(job_name: str, ttl_seconds: int) -> bool:
+    # Not released after the run: holding it for most of the interval also stops workers
+    # whose timers fire a little later from repeating the same run
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    return bool(await get_redis().set(JOB_LOCK_PREFIX + job_name, owner, nx=True, ex=ttl_seconds))
+
+async def run_scheduled_token_cleanup():
+    lock_ttl = max(1, int(CLEANUP_INTERVAL_HOURS * 3600 * 0.9))
+    try:
+        if not await acquire_job_lock("token_cleanup", lock_ttl):
+            logger.info("Token cleanup skipped, another process owns this run")
+            return
+    except RedisError as e:
+        logger.error("Token cleanup skipped, could not acquire lock: %s", str(e))
+        return
+    try:
+        await perform_token_cleanup()
+    except Exception:
+        logger.exception("Token cleanup failed")
 
 # Define the actual token cleanup logic
-def perform_token_cleanup(db):
-    # Get the current timestamp from the database
-    db_timestamp = db.query(func.current_timestamp()).scalar()
-    # Mark expiring tokens as expired (soft delete)
-    expiration_threshold = db_timestamp - timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    # Batch update to mark tokens as expired
-    update_query = db.query(TokenTable).filter(
-        TokenTable.status == True,
-        TokenTable.created_date < expiration_threshold
-    ).update(
-        {TokenTable.status: False},
-        synchronize_session=False
-    )
-    db.commit()
-    # Batch delete expired tokens (permanently remove from database)
-    delete_query = db.query(TokenTable).filter(TokenTable.status == False).delete(
-        synchronize_session=False
-    )
-    db.commit()
-    return {"message": "Tokens cleaned up successfully"}
+CLEANUP_CHECKPOINT_KEY = "cleanup:token:checkpoint"
+
+async def _load_cleanup_checkpoint():
+    try:
+        return await get_redis().hgetall(CLEANUP_CHECKPOINT_KEY)
+    except RedisError as e:
+        logger.warning("Could not read cleanup checkpoint: %s", str(e))
+        return {}
+
+async def _save_cleanup_checkpoint(cutoff: datetime, deleted: int, batches: int):
+    try:
+        await get_redis().hset(
+            CLEANUP_CHECKPOINT_KEY,
+            mapping={"cutoff": cutoff.isoformat(), "deleted": deleted, "batches": batches},
+        )
+    except RedisError as e:
+        logger.warning("Could not save cleanup checkpoint: %s", str(e))
+
+async def _clear_cleanup_checkpoint():
+    try:
+        await get_redis().delete(CLEANUP_CHECKPOINT_KEY)
+    except RedisError as e:
+        logger.warning("Could not clear cleanup checkpoint: %s", str(e))
+
+async def delete_expired_token_batch(cutoff: datetime, batch_size: int) -> int:
+    return await get_token_store().delete_expired(cutoff, batch_size)
+
+async def perform_token_cleanup(batch_size: int = CLEANUP_BATCH_SIZE, pause_seconds: float = CLEANUP_BATCH_PAUSE_SECONDS):
+    if not get_token_store().needs_cleanup:
+        # Tokens in Redis expire on their own
+        return {"message": "Token store does not need cleanup", "deleted": 0, "batches": 0, "elapsed_seconds": 0.0}
+
+    # Resume an interrupted run with its original cutoff so its totals stay meaningful
+    checkpoint = await _load_cleanup_checkpoint()
+    if checkpoint:
+        cutoff = datetime.fromisoformat(checkpoint["cutoff"])
+        deleted = int(checkpoint["deleted"])
+        batches = int(checkpoint["batches"])
+        logger.info("Resuming token cleanup from %s (%d rows already deleted)", cutoff.isoformat(), deleted)
+    else:
+        cutoff = datetime.utcnow()
+        deleted = 0
+        batches = 0
+
+    started = time.perf_counter()
+    while True:
+        batch_started = time.perf_counter()
+        batch_deleted = await delete_expired_token_batch(cutoff, batch_size)
+        batches += 1
+        deleted += batch_deleted
+        logger.info(
+            "Token cleanup batch %d: deleted %d rows in %.1f ms",
+            batches, batch_deleted, (time.perf_counter() - batch_started) * 1000,
+        )
+        await _save_cleanup_checkpoint(cutoff, deleted, batches)
+        if batch_deleted < batch_size:
+            break
+        await asyncio.sleep(pause_seconds)
 
-# Define the cleanup background task
-def cleanup_tokens_background_task(background_tasks: BackgroundTasks, db=Depends(get_session)):
-    background_tasks.add_task(perform_token_cleanup, db)
\ No newline at end of file
+    await _clear_cleanup_checkpoint()
+    elapsed = time.perf_counter() - started
+    logger.info("Token cleanup finished: %d rows in %d batches, %.1f s", deleted, batches, elapsed)
+    return {"message": "Tokens cleaned up successfully", "deleted": deleted, "batches": batches, "elapsed_seconds": elapsed}
\ No newline at end of file
@@ -0,0 +1,29 @@
+# Compares two saved result files metric by metric.
+#   python -m benchmarks.compare benchmarks/results/load-A.json benchmarks/results/load-B.json
+import argparse
+import json
+
+METRICS = ("throughput_rps", "shed_rate", "ops_per_sec", "p50_ms", "p95_ms", "p99_ms", "p50_us", "p99_us", "mean_us")
+
+def main(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    print(f"baseline  {baseline['git_commit']} {baseline['timestamp']}")
+    print(f"candidate {candidate['git_commit']} {candidate['timestamp']}")
+    for name, before in baseline["results"].items():
+        after = candidate["results"].get(name)
+        if after is None:
+            continue
+        for metric in METRICS:
+            if metric in before and metric in after:
+                old, new = before[metric], after[metric]
+                change = ((new - old) / old * 100) if old else 0.0
+                print(f"{name:>18} {metric:>15}: {old:12.2f} -> {new:12.2f} ({change:+.1f}%)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files")
+    parser.add_argument("baseline")
+    parser.add_argument("candidate")
+    main(parser.parse_args())
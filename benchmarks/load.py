@@ -0,0 +1,131 @@
+# Drives the auth endpoints in-process at a fixed concurrency and reports throughput and latency percentiles.
+#   python -m benchmarks.load --scenario login --requests 500 --concurrency 32
+import argparse
+import asyncio
+import itertools
+import logging
+import time
+from collections import Counter
+
+from benchmarks import environment
+from benchmarks.results import save_results, summarize
+
+SCENARIOS = ("register", "login", "logout", "update")
+
+async def seed_users(count: int):
+    # Inserted directly with one shared hash so seeding does not dominate the run
+    from datetime import datetime, timedelta
+    from app.config.settings import REFRESH_TOKEN_EXPIRE_MINUTES
+    from app.db.database import SessionLocal
+    from app.db.models import User
+    from app.db.token_store import get_token_store
+    from app.utils.digest import token_digest
+    from app.utils.token_utils import create_access_token, create_refresh_token, get_hashed_password
+
+    hashed = get_hashed_password(environment.BENCH_PASSWORD)
+    users = []
+    async with SessionLocal() as db:
+        for i in range(count):
+            db.add(User(username=f"seed{i}", email=f"seed{i}@example.com", password=hashed, currency="EUR"))
+        await db.commit()
+        for i in range(count):
+            user_id = i + 1
+            access = create_access_token(user_id)
+            refresh = create_refresh_token(user_id)
+            await get_token_store().add(
+                db,
+                user_id,
+                token_digest(access),
+                token_digest(refresh),
+                datetime.utcnow() + timedelta(minutes=REFRESH_TOKEN_EXPIRE_MINUTES),
+            )
+            users.append({"user_id": user_id, "email": f"seed{i}@example.com", "username": f"seed{i}", "access_token": access})
+        await db.commit()
+    return users
+
+def build_request(scenario: str, i: int, users):
+    user = users[i % len(users)]
+    if scenario == "register":
+        return "POST", "/auth/register", {
+            "json": {"username": f"bench{i}", "email": f"bench{i}@example.com",
+                     "password": environment.BENCH_PASSWORD, "currency": "EUR"},
+        }
+    if scenario == "login":
+        return "POST", "/auth/login", {"json": {"email": user["email"], "password": environment.BENCH_PASSWORD}}
+    if scenario == "logout":
+        return "POST", "/auth/logout", {"headers": {"Authorization": f"Bearer {user['access_token']}"}}
+    return "PUT", f"/user/update/{user['user_id']}", {
+        "headers": {"Authorization": f"Bearer {user['access_token']}"},
+        "json": {"new_email": "", "new_username": "", "old_password": environment.BENCH_PASSWORD,
+                 "new_password": "", "new_currency": ""},
+    }
+
+async def run_scenario(client, scenario: str, total: int, concurrency: int, users):
+    latencies = []
+    statuses = Counter()
+    counter = itertools.count()
+
+    async def worker():
+        while True:
+            i = next(counter)
+            if i >= total:
+                return
+            method, url, kwargs = build_request(scenario, i, users)
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            # Only completed work counts towards throughput and latency; an instant 503 is not a fast login
+            if response.status_code < 300:
+                latencies.append(time.perf_counter() - started)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    result = summarize(latencies, elapsed)
+    result["succeeded"] = result["requests"]
+    result["requests"] = total
+    result["shed_rate"] = statuses[503] / total if total else 0.0
+    result["status_codes"] = {str(code): count for code, count in sorted(statuses.items())}
+    return result
+
+async def main(args):
+    import httpx
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+
+    from main import app
+
+    results = {}
+    try:
+        transport = httpx.ASGITransport(app=app, client=("127.0.0.1", 50000))
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            for scenario in args.scenario:
+                # Logout revokes the seeded tokens, so every scenario starts from fresh data
+                await environment.setup()
+                users = await seed_users(max(args.users, args.requests if scenario == "logout" else 0))
+                results[scenario] = await run_scenario(client, scenario, args.requests, args.concurrency, users)
+                r = results[scenario]
+                print(f"{scenario:>9}: {r['succeeded']}/{r['requests']} ok, {r['throughput_rps']:.1f} req/s, "
+                      f"p50 {r['p50_ms']:.1f} ms, p95 {r['p95_ms']:.1f} ms, p99 {r['p99_ms']:.1f} ms, "
+                      f"shed {r['shed_rate']:.1%}, status {r['status_codes']}")
+    finally:
+        await environment.teardown()
+
+    config = {
+        "scenarios": args.scenario,
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "users": args.users,
+        "database_url": environment.BENCH_DATABASE_URL,
+        "redis": environment.BENCH_REDIS_URL or "fakeredis",
+    }
+    print("Results written to", save_results("load", config, results, args.output))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the auth endpoints")
+    parser.add_argument("--scenario", nargs="+", choices=SCENARIOS, default=list(SCENARIOS))
+    parser.add_argument("--requests", type=int, default=200, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--users", type=int, default=100, help="seeded accounts")
+    parser.add_argument("--output", help="results file (default: benchmarks/results/load-<time>.json)")
+    asyncio.run(main(parser.parse_args()))
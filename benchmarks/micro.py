@@ -0,0 +1,76 @@
+# Micro-benchmarks for the per-request building blocks: hashing, JWT encode/decode and the rate-limit check.
+#   python -m benchmarks.micro --iterations 2000
+import argparse
+import asyncio
+import statistics
+import time
+
+from benchmarks import environment
+from benchmarks.results import save_results
+
+def measure(fn, iterations: int) -> dict:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return _stats(timings)
+
+async def measure_async(fn, iterations: int) -> dict:
+    timings = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - started)
+    return _stats(timings)
+
+def _stats(timings) -> dict:
+    timings.sort()
+    return {
+        "iterations": len(timings),
+        "mean_us": statistics.fmean(timings) * 1e6,
+        "p50_us": timings[len(timings) // 2] * 1e6,
+        "p99_us": timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e6,
+        "ops_per_sec": len(timings) / sum(timings) if sum(timings) else 0.0,
+    }
+
+async def main(args):
+    from app.utils.jwt_utils import decodeJWT, get_verified_claims
+    from app.utils.rate_limit import RateLimiter
+    from app.utils.token_utils import create_access_token, get_hashed_password, verify_password
+
+    password = environment.BENCH_PASSWORD
+    hashed = get_hashed_password(password)
+    token = create_access_token(1)
+    limiter = RateLimiter("bench", 10 ** 9, 3600, redis=environment.create_redis())
+    # Same limiter without leases: every check is a Redis round trip
+    redis_limiter = RateLimiter("bench_redis", 10 ** 9, 3600, redis=environment.create_redis())
+    redis_limiter.lease_size = 1
+
+    results = {
+        # bcrypt is slow by design, so it gets fewer iterations
+        "hash_password": measure(lambda: get_hashed_password(password), args.hash_iterations),
+        "verify_password": measure(lambda: verify_password(password, hashed), args.hash_iterations),
+        "jwt_encode": measure(lambda: create_access_token(1), args.iterations),
+        "jwt_decode": measure(lambda: decodeJWT(token), args.iterations),
+        "jwt_decode_cached": measure(lambda: get_verified_claims(token), args.iterations),
+        "rate_limit_check": await measure_async(lambda: limiter.hit("rate_limit:bench:127.0.0.1"), args.iterations),
+        "rate_limit_redis": await measure_async(lambda: redis_limiter.hit("rate_limit:bench:127.0.0.2"), args.iterations),
+    }
+    for name, r in results.items():
+        print(f"{name:>18}: mean {r['mean_us']:10.1f} us, p50 {r['p50_us']:10.1f} us, "
+              f"p99 {r['p99_us']:10.1f} us, {r['ops_per_sec']:10.0f} ops/s")
+
+    config = {
+        "iterations": args.iterations,
+        "hash_iterations": args.hash_iterations,
+        "redis": environment.BENCH_REDIS_URL or "fakeredis",
+    }
+    print("Results written to", save_results("micro", config, results, args.output))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Micro-benchmark hashing, JWT and rate limiting")
+    parser.add_argument("--iterations", type=int, default=2000)
+    parser.add_argument("--hash-iterations", type=int, default=20)
+    parser.add_argument("--output", help="results file (default: benchmarks/results/micro-<time>.json)")
+    asyncio.run(main(parser.parse_args()))
@@ -1,11 +1,73 @@
 # main.py
+import time
+# Measured from here so worker boot time can be compared across releases
+_import_started = time.perf_counter()
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.config.settings import ALLOWED_ORIGINS
+from app.config.settings import ALLOWED_ORIGINS, CLEANUP_SCHEDULER_ENABLED, EMAIL_WORKER_ENABLED
 from app.api.auth import user_routes, auth_routes  # Import your API routers here
-from app.api import cleanup
+from app.api import jwks, metrics
+from app.api.admin import admin_routes
+from app.db.database import dispose_engine, get_engine
+from app.db.token_store import get_token_store
+from app.utils.breached_passwords import get_breached_password_filter
+from app.utils.jwt_keys import get_key_set
+from app.utils.metrics import STARTUP_SECONDS, MetricsMiddleware
+from app.utils.redis_client import close_redis, get_redis
+from app.utils.token_utils import calibrate_password_hashing, shutdown_hash_executor
+from app.utils.user_cache import run_invalidation_listener
+from background_tasks import create_cleanup_scheduler
+
+logger = logging.getLogger(__name__)
 
-app = FastAPI()
+def log_task_failure(task: asyncio.Task):
+    # Background tasks are only awaited at shutdown; without this one that dies would do so silently
+    if not task.cancelled() and task.exception() is not None:
+        logger.error("Background task %s stopped", task.get_name(), exc_info=task.exception())
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Every external resource is created here, never at import, so the app imports without live services
+    started = time.perf_counter()
+    calibrate_password_hashing()
+    # Fail at startup rather than on the first login when the signing keys are misconfigured
+    get_key_set()
+    get_breached_password_filter()
+    get_engine()
+    get_redis()
+    scheduler = None
+    if CLEANUP_SCHEDULER_ENABLED and get_token_store().needs_cleanup:
+        scheduler = create_cleanup_scheduler()
+        scheduler.start()
+    tasks = [asyncio.create_task(run_invalidation_listener(), name="user-cache-invalidation")]
+    if EMAIL_WORKER_ENABLED:
+        # Only processes running the worker load the email transports
+        from app.email.worker import run_email_worker
+        tasks.append(asyncio.create_task(run_email_worker(), name="email-worker"))
+    for task in tasks:
+        task.add_done_callback(log_task_failure)
+    STARTUP_SECONDS.labels("lifespan").set(time.perf_counter() - started)
+    logger.info(
+        "Worker started in %.0f ms (imports %.0f ms)",
+        (time.perf_counter() - _import_started) * 1000,
+        _import_seconds * 1000,
+    )
+    yield
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    if scheduler is not None:
+        scheduler.shutdown(wait=False)
+    shutdown_hash_executor()
+    await close_redis()
+    await dispose_engine()
+
+app = FastAPI(lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -14,8 +76,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(MetricsMiddleware)
 
 # Include your API routers here
 app.include_router(user_routes.router, prefix="/user", tags=["user"])
 app.include_router(auth_routes.router, prefix="/auth", tags=["auth"])
-app.include_router(cleanup.router, prefix="/api", tags=["api"])
\ No newline at end of file
+app.include_router(admin_routes.router, prefix="/admin", tags=["admin"])
+app.include_router(jwks.router, tags=["jwks"])
+app.include_router(metrics.router, tags=["metrics"])
+
+_import_seconds = time.perf_counter() - _import_started
+STARTUP_SECONDS.labels("import").set(_import_seconds)
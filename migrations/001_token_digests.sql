@@ -0,0 +1,35 @@
+-- Store token digests instead of raw JWTs and index the token table for logout and cleanup.
+-- The digests match app.utils.digest.token_digest (SHA-256 of the UTF-8 token). Requires PostgreSQL 11+.
+BEGIN;
+
+ALTER TABLE token
+    ADD COLUMN access_token_hash bytea,
+    ADD COLUMN refresh_token_hash bytea;
+
+UPDATE token SET
+    access_token_hash = sha256(convert_to(access_token, 'UTF8')),
+    refresh_token_hash = sha256(convert_to(refresh_token, 'UTF8'));
+
+-- Rows without an owner or status could never be used again
+DELETE FROM token WHERE user_id IS NULL;
+UPDATE token SET status = FALSE WHERE status IS NULL;
+
+ALTER TABLE token DROP CONSTRAINT token_pkey;
+ALTER TABLE token
+    DROP COLUMN access_token,
+    DROP COLUMN refresh_token;
+ALTER TABLE token
+    ALTER COLUMN access_token_hash SET NOT NULL,
+    ALTER COLUMN refresh_token_hash SET NOT NULL,
+    ALTER COLUMN user_id SET NOT NULL,
+    ALTER COLUMN status SET NOT NULL,
+    ALTER COLUMN status SET DEFAULT TRUE;
+ALTER TABLE token ADD CONSTRAINT token_pkey PRIMARY KEY (access_token_hash);
+
+CREATE INDEX ix_token_user_id_status ON token (user_id, status);
+CREATE INDEX ix_token_status_created_date ON token (status, created_date);
+
+COMMIT;
+
+-- Give the space held by the old 450-character columns back (takes an exclusive lock on the table)
+VACUUM FULL ANALYZE token;
@@ -0,0 +1,14 @@
+-- Track when each token row stops being usable so cleanup can delete by expiry in small batches.
+BEGIN;
+
+ALTER TABLE token ADD COLUMN expires_at timestamp;
+
+-- Existing rows get the refresh token lifetime (7 days) from their creation
+UPDATE token SET expires_at = created_date + interval '7 days';
+
+ALTER TABLE token ALTER COLUMN expires_at SET NOT NULL;
+
+DROP INDEX ix_token_status_created_date;
+CREATE INDEX ix_token_expires_at ON token (expires_at);
+
+COMMIT;
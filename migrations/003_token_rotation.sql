@@ -0,0 +1,9 @@
+-- Look up sessions by refresh token for /auth/refresh and keep the rotated-out token for reuse detection.
+BEGIN;
+
+ALTER TABLE token ADD COLUMN previous_refresh_token_hash bytea;
+
+CREATE INDEX ix_token_refresh_token_hash ON token (refresh_token_hash);
+CREATE INDEX ix_token_previous_refresh_token_hash ON token (previous_refresh_token_hash);
+
+COMMIT;
@@ -0,0 +1,6 @@
+-- Per-user token generation: bumping it revokes every access and refresh token issued to the user.
+BEGIN;
+
+ALTER TABLE users ADD COLUMN token_generation integer NOT NULL DEFAULT 0;
+
+COMMIT;
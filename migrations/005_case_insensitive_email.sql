@@ -0,0 +1,11 @@
+-- Case-insensitive unique emails: emails are stored lower-cased and the unique index is on lower(email).
+-- Accounts whose emails differ only in case stop the migration (it rolls back); find them with
+--   SELECT lower(trim(email)), array_agg(user_id) FROM users GROUP BY 1 HAVING count(*) > 1;
+BEGIN;
+
+UPDATE users SET email = lower(trim(email)) WHERE email <> lower(trim(email));
+
+CREATE UNIQUE INDEX uq_users_email_lower ON users (lower(email));
+ALTER TABLE users DROP CONSTRAINT users_email_key;
+
+COMMIT;
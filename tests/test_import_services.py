@@ -0,0 +1,68 @@
+# Runs offline against SQLite and fakeredis: pip install -r requirements-bench.txt && python -m pytest tests
+import asyncio
+import os
+import tempfile
+
+os.environ.setdefault("BENCH_DATABASE_URL", f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/test.db")
+
+from benchmarks import environment  # noqa: E402  (sets the environment before app is imported)
+
+def test_non_string_fields_are_reported_per_row():
+    from app.api.admin.import_services import hash_many, import_users
+
+    async def run():
+        await environment.setup()
+        try:
+            rows = [
+                (1, {"email": 5, "password": "x"}),
+                (2, {"email": "ok@example.com", "password": 123}),
+                (3, {"email": "valid@example.com", "password": environment.BENCH_PASSWORD}),
+            ]
+
+            async def hash_passwords(passwords):
+                return hash_many(passwords)
+
+            return await import_users(iter_rows(rows), hash_passwords=hash_passwords)
+        finally:
+            await environment.teardown()
+
+    async def iter_rows(rows):
+        for row in rows:
+            yield row
+
+    report = asyncio.run(run())
+    assert report.imported == 1
+    assert [(e["line"], e["detail"]) for e in report.errors] == [
+        (1, "email must be a string"),
+        (2, "password must be a string"),
+    ]
+
+def test_over_long_fields_are_reported_per_row():
+    from app.api.admin.import_services import hash_many, import_users
+
+    async def run():
+        await environment.setup()
+        try:
+            rows = [
+                (1, {"email": "long@example.com", "username": "u" * 101, "password": environment.BENCH_PASSWORD}),
+                (2, {"email": "eur@example.com", "currency": "EURO", "password": environment.BENCH_PASSWORD}),
+                (3, {"email": "fits@example.com", "username": "u" * 100, "password": environment.BENCH_PASSWORD}),
+            ]
+
+            async def hash_passwords(passwords):
+                return hash_many(passwords)
+
+            async def iter_rows():
+                for row in rows:
+                    yield row
+
+            return await import_users(iter_rows(), hash_passwords=hash_passwords)
+        finally:
+            await environment.teardown()
+
+    report = asyncio.run(run())
+    assert report.imported == 1
+    assert [(e["line"], e["detail"]) for e in report.errors] == [
+        (1, "username is longer than 100 characters"),
+        (2, "currency is longer than 3 characters"),
+    ]